@@ -15,6 +15,7 @@ from custom_nodes.Comfy_KepListStuff.nodes.list_utils import (
     RepeatList,
     JoinListAny,
     StringListFromNewline,
+    MaterializeList,
 )
 from custom_nodes.Comfy_KepListStuff.nodes.range_nodes import (
     IntRangeNode,
@@ -22,7 +23,8 @@ from custom_nodes.Comfy_KepListStuff.nodes.range_nodes import (
     IntNumStepsRangeNode,
     FloatNumStepsRangeNode,
 )
-from custom_nodes.Comfy_KepListStuff.nodes.xy import UnzippedProductAny
+from custom_nodes.Comfy_KepListStuff.nodes.sweep import SaveSweepCells, AssembleSweepGrid
+from custom_nodes.Comfy_KepListStuff.nodes.xy import UnzippedProductAny, NDimProductAny
 
 NODE_CLASS_MAPPINGS = {
     "Range(Step) - Int": IntRangeNode,
@@ -43,7 +45,11 @@ NODE_CLASS_MAPPINGS = {
     "Kep_VariableImageBuilder": VariableImageBuilder,
     "Kep_ReverseList": ReverseList,
     "Kep_RepeatList": RepeatList,
-    "Kep_JoinListAny": JoinListAny
+    "Kep_JoinListAny": JoinListAny,
+    "Kep_MaterializeList": MaterializeList,
+    "Kep_NDimProductAny": NDimProductAny,
+    "Kep_SaveSweepCells": SaveSweepCells,
+    "Kep_AssembleSweepGrid": AssembleSweepGrid,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
@@ -55,4 +61,8 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "Kep_RepeatList": "Repeat List",
     "Kep_JoinListAny": "Join List Any",
     "KepStringListFromNewline": "String List From Newline",
+    "Kep_MaterializeList": "Materialize List",
+    "Kep_NDimProductAny": "N-D Product Any",
+    "Kep_SaveSweepCells": "Save Sweep Cells",
+    "Kep_AssembleSweepGrid": "Assemble Sweep Grid",
 }
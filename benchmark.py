@@ -0,0 +1,291 @@
+"""
+Benchmarks every node in NODE_CLASS_MAPPINGS with synthetic inputs.
+
+Run from the ComfyUI root:
+    python -m custom_nodes.Comfy_KepListStuff.benchmark --output bench.json
+    python -m custom_nodes.Comfy_KepListStuff.benchmark --output new.json --compare bench.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+import torch
+from PIL import Image
+
+from custom_nodes.Comfy_KepListStuff import NODE_CLASS_MAPPINGS
+from custom_nodes.Comfy_KepListStuff.sequences import materialize, repeat
+
+
+class BenchmarkCase(NamedTuple):
+    name: str
+    node: str
+    make_inputs: Callable[[], Dict[str, Any]]
+
+
+def run_node(node: str, inputs: Dict[str, Any]) -> Any:
+    """
+    Runs a node and copies its list outputs into lists, like ComfyUI does, so nodes returning lazy sequences
+    are timed including the computation of their values
+    """
+    node_class = NODE_CLASS_MAPPINGS[node]
+    outputs = getattr(node_class(), node_class.FUNCTION)(**inputs)
+    output_is_list = getattr(node_class, "OUTPUT_IS_LIST", ())
+    return tuple(
+        materialize(output) if slot < len(output_is_list) and output_is_list[slot] else output
+        for slot, output in enumerate(outputs)
+    )
+
+
+def _batches(count: int, batch_size: int, size: int) -> List[torch.Tensor]:
+    generator = torch.Generator().manual_seed(0)
+    return [torch.rand(batch_size, size, size, 3, generator=generator) for _ in range(count)]
+
+
+def _grid_inputs(grid: int, batch_size: int, size: int) -> Dict[str, Any]:
+    return {
+        "images": _batches(grid * grid, batch_size, size),
+        "splits": [grid],
+    }
+
+
+def _image_folder(folder: Path, count: int, size: int) -> str:
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(0)
+    for idx in range(count):
+        pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(folder / f"image_{idx}.png")
+    return str(folder)
+
+
+def build_cases(grid_sizes: List[int], image_size: int, list_size: int, work_dir: Path) -> List[BenchmarkCase]:
+    """
+    :param work_dir: Directory for the files cases write or read, the caller removes it after running them
+    """
+    cases: List[BenchmarkCase] = []
+    list_starts = list(range(0, list_size // 100))
+
+    cases += [
+        BenchmarkCase("int_range_step", "Range(Step) - Int", lambda: {
+            "start": [0], "stop": [list_size], "step": [1], "end_mode": ["Inclusive"],
+        }),
+        BenchmarkCase("int_range_step_list_inputs", "Range(Step) - Int", lambda: {
+            "start": list_starts, "stop": [s + 100 for s in list_starts], "step": [1], "end_mode": ["Exclusive"],
+        }),
+        BenchmarkCase("int_range_num_steps", "Range(Num Steps) - Int", lambda: {
+            "start": [0], "stop": [list_size - 1], "num_steps": [list_size],
+            "end_mode": ["Inclusive"], "allow_uneven_steps": ["True"],
+        }),
+        BenchmarkCase("int_range_num_steps_list_inputs", "Range(Num Steps) - Int", lambda: {
+            "start": list_starts, "stop": [s + 99 for s in list_starts], "num_steps": [100],
+            "end_mode": ["Inclusive"], "allow_uneven_steps": ["False"],
+        }),
+        BenchmarkCase("float_range_step", "Range(Step) - Float", lambda: {
+            "start": [0.0], "stop": [list_size / 100], "step": [0.01], "end_mode": ["Inclusive"],
+        }),
+        BenchmarkCase("float_range_step_list_inputs", "Range(Step) - Float", lambda: {
+            "start": [float(s) for s in list_starts], "stop": [s + 1.0 for s in list_starts], "step": [0.01],
+            "end_mode": ["Exclusive"],
+        }),
+        BenchmarkCase("float_range_num_steps", "Range(Num Steps) - Float", lambda: {
+            "start": [0.0], "stop": [1.0], "num_steps": [list_size],
+        }),
+        BenchmarkCase("float_range_num_steps_list_inputs", "Range(Num Steps) - Float", lambda: {
+            "start": [float(s) for s in list_starts], "stop": [s + 1.0 for s in list_starts], "num_steps": [100],
+        }),
+    ]
+
+    cases += [
+        BenchmarkCase("list_length", "List Length", lambda: {"In": list(range(list_size))}),
+        BenchmarkCase("reverse_list", "Kep_ReverseList", lambda: {"In": list(range(list_size))}),
+        BenchmarkCase("materialize_list", "Kep_MaterializeList", lambda: {
+            "In": repeat(list(range(100)), list_size // 100),
+        }),
+        BenchmarkCase("repeat_list", "Kep_RepeatList", lambda: {"In": list(range(100)), "Count": [list_size // 100]}),
+        BenchmarkCase("join_list_any", "Kep_JoinListAny", lambda: {
+            "In1": list(range(list_size)), "In2": list(range(list_size)), "In3": list(range(list_size)),
+        }),
+        BenchmarkCase("join_float_lists", "Join Float Lists", lambda: {
+            "In1": [float(i) for i in range(list_size)], "In2": [float(i) for i in range(list_size)],
+        }),
+        BenchmarkCase("join_image_lists", "Join Image Lists", lambda: {
+            "In1": _batches(64, 1, 64), "In2": _batches(64, 1, 64),
+        }),
+        BenchmarkCase("string_list", "KepStringList", lambda: {
+            "Text1": "a", "Text2": "b", "Text3": "c", "Text4": "d", "Text5": "e", "Text6": "", "Text7": "g",
+        }),
+        BenchmarkCase("string_list_from_newline", "KepStringListFromNewline", lambda: {
+            "Text": "\n".join(str(i) for i in range(list_size)),
+        }),
+        BenchmarkCase("unzipped_product_any", "XYAny", lambda: {
+            "X": list(range(100)), "Y": list(range(100)), "Z": list(range(10)),
+            "X_Label_Fallback": ["str()"], "Y_Label_Fallback": ["Numbers"], "Z_Label_Fallback": ["str()"],
+        }),
+        BenchmarkCase("ndim_product_any", "Kep_NDimProductAny", lambda: {
+            "Axis_1": list(range(20)), "Axis_2": list(range(20)), "Axis_3": list(range(10)),
+            "Axis_4": list(range(5)), "Axis_5": list(range(4)), "Axis_6": list(range(3)),
+        }),
+    ]
+
+    cases += [
+        BenchmarkCase("empty_images", "Empty Images", lambda: {
+            "num_images": [64], "splits": [8], "batch_size": [4],
+        }),
+        BenchmarkCase("variable_image_builder", "Kep_VariableImageBuilder", lambda: {
+            "r": list(range(0, 256, 16)), "g": [20], "b": [30], "a": [255],
+            "width": [image_size], "height": [image_size], "batch_size": [16], "mode": ["RGBA"],
+        }),
+        BenchmarkCase("image_overlay", "Image Overlay", lambda: {
+            "images": _batches(16, 4, image_size), "float_labels": [0.5], "int_labels": list(range(16)),
+            "str_labels": ["label"],
+        }),
+    ]
+
+    loader_folder: Dict[str, str] = {}
+
+    def loader_inputs() -> Dict[str, Any]:
+        if "path" not in loader_folder:
+            loader_folder["path"] = _image_folder(work_dir / "images", 64, image_size)
+        return {"folder_path": loader_folder["path"], "file_filter": "*.png", "sort_method": "numerical"}
+
+    cases.append(BenchmarkCase("image_list_loader", "ImageListLoader", loader_inputs))
+
+    cell_folder: Dict[str, str] = {}
+
+    def save_cells_inputs() -> Dict[str, Any]:
+        if "path" not in cell_folder:
+            cell_folder["path"] = str(work_dir / "cells")
+        return {"images": _batches(64, 1, image_size), "indices": list(range(64)), "directory": [cell_folder["path"]]}
+
+    def assemble_inputs() -> Dict[str, Any]:
+        inputs = save_cells_inputs()
+        run_node("Kep_SaveSweepCells", inputs)
+        return {
+            "directory": inputs["directory"], "total_images": [64], "splits": [8],
+            "flip_axis": ["False"], "batch_stack_mode": ["horizontal"], "z_enabled": ["False"],
+            "x_labels": list(range(8)), "y_labels": list(range(8)),
+        }
+
+    cases.append(BenchmarkCase("save_sweep_cells", "Kep_SaveSweepCells", save_cells_inputs))
+    cases.append(BenchmarkCase("assemble_sweep_grid_8x8", "Kep_AssembleSweepGrid", assemble_inputs))
+
+    for grid in grid_sizes:
+        cases.append(BenchmarkCase(f"xy_image_{grid}x{grid}", "XYImage", lambda grid=grid: {
+            **_grid_inputs(grid, 1, image_size),
+            "flip_axis": ["False"], "batch_stack_mode": ["horizontal"], "z_enabled": ["False"],
+            "x_main_label": ["X"], "y_main_label": ["Y"],
+            "x_labels": list(range(grid)), "y_labels": list(range(grid)),
+        }))
+        cases.append(BenchmarkCase(f"xy_image_export_png_{grid}x{grid}", "XYImage", lambda grid=grid: {
+            **_grid_inputs(grid, 1, image_size),
+            "flip_axis": ["False"], "batch_stack_mode": ["horizontal"], "z_enabled": ["False"],
+            "x_main_label": ["X"], "y_main_label": ["Y"],
+            "x_labels": list(range(grid)), "y_labels": list(range(grid)),
+            "export_format": ["png"], "export_path": [str(work_dir / "exports" / f"xy_image_{grid}")],
+        }))
+        cases.append(BenchmarkCase(f"stack_images_{grid}x{grid}", "Stack Images", lambda grid=grid: {
+            **_grid_inputs(grid, 1, image_size),
+            "stack_mode": ["horizontal"], "batch_stack_mode": ["horizontal"],
+            "horizontal_labels": list(range(grid)), "vertical_labels": list(range(grid)),
+        }))
+
+    return cases
+
+
+def check_coverage(cases: List[BenchmarkCase]) -> None:
+    missing = set(NODE_CLASS_MAPPINGS) - {case.node for case in cases}
+    if missing:
+        raise Exception(f"No benchmark cases for nodes: {', '.join(sorted(missing))}")
+
+
+def run_cases(cases: List[BenchmarkCase], repeats: int) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for case in cases:
+        inputs = case.make_inputs()
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run_node(case.node, inputs)
+            timings.append(time.perf_counter() - start)
+        results[case.name] = {
+            "node": case.node,
+            "median_s": statistics.median(timings),
+            "min_s": min(timings),
+            "repeats": repeats,
+        }
+        print(f"{case.name:<40} {results[case.name]['median_s'] * 1000:>10.2f} ms")
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    """
+    :return: Names of the cases that got slower than baseline by more than threshold (relative)
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median_s"] / max(baseline[name]["median_s"], 1e-9)
+        result["baseline_median_s"] = baseline[name]["median_s"]
+        result["ratio"] = ratio
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "REGRESSION"
+        print(f"{name:<40} {ratio:>8.2f}x {flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark every node in NODE_CLASS_MAPPINGS")
+    parser.add_argument("--output", default="bench_output.json", help="JSON file to write results to")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown flagged as regression")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--grid-sizes", default="2,4,8,16,32")
+    parser.add_argument("--image-size", type=int, default=64)
+    parser.add_argument("--list-size", type=int, default=10000)
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this string")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="kep_bench_") as work_dir:
+        cases = build_cases(
+            [int(size) for size in args.grid_sizes.split(",")], args.image_size, args.list_size, Path(work_dir)
+        )
+        check_coverage(cases)
+        cases = [case for case in cases if args.filter in case.name]
+
+        results = run_cases(cases, args.repeats)
+
+    regressions: List[str] = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "meta": {
+                "python": sys.version,
+                "platform": platform.platform(),
+                "torch": torch.__version__,
+                "args": vars(args),
+            },
+            "results": results,
+            "regressions": regressions,
+        }, f, indent=2)
+
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,422 @@
+import hashlib
+import math
+import tempfile
+import weakref
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from torch import Tensor
+
+from custom_nodes.Comfy_KepListStuff.labels import render_label
+from custom_nodes.Comfy_KepListStuff.utils import temp_directory, uint82tensor
+
+
+def memmap_tensor(shape: Tuple[int, ...], dtype: torch.dtype, directory: Optional[Path] = None) -> Tensor:
+    """
+    Zero filled tensor backed by a temp file instead of RAM.
+    The file is anonymous on POSIX and deleted on close elsewhere, the mapping keeps its own handle,
+    so the file disappears with the last reference to the tensor on every platform.
+    :param directory: Directory of the file, ComfyUI's temp directory by default. The system temp directory
+        is often a tmpfs, which keeps the pages in RAM and defeats the memmap.
+    """
+    if directory is None:
+        directory = temp_directory()
+    directory.mkdir(parents=True, exist_ok=True)
+    np_dtype = torch.empty(0, dtype=dtype).numpy().dtype
+    with tempfile.TemporaryFile(prefix="xyimage_", suffix=f".{np_dtype.name}", dir=directory) as f:
+        return torch.from_numpy(np.memmap(f, dtype=np_dtype, mode="w+", shape=shape))
+
+
+def page_cells(batches: Sequence[Tensor]) -> List[Tensor]:
+    """
+    Batches of a page as a list. Lazy image lists decode an image on every access, so pages are copied
+    once before their bands, tiles or cells are rendered, which index the batches over and over.
+    """
+    return batches if isinstance(batches, list) else list(batches)
+
+
+class LabelStrip(NamedTuple):
+    """
+    A label drawn centered at the top of a white strip, optionally rotated 90 degrees before placement.
+    width/height are the size of the strip before rotation, x/y the placement on the canvas after rotation.
+    """
+    text: str
+    x: int
+    y: int
+    width: int
+    height: int
+    size: int
+    text_x: float
+    rotate: bool = False
+
+
+class GridCell(NamedTuple):
+    """
+    A single batch placed on the grid. batch_idx is relative to the first batch of the page.
+    """
+    batch_idx: int
+    x: int
+    y: int
+
+
+def render_label_strip(strip: LabelStrip, color: str) -> Tensor:
+    """
+    :param strip:
+    :param color:
+    :return: Tensor [H, W, 3] of the strip as it is placed on the canvas
+    """
+    bitmap = render_label(strip.text, strip.size, color, strip.rotate, strip.width, strip.height, strip.text_x)
+    return uint82tensor(bitmap)
+
+
+class GridLayout:
+    """
+    Describes where every label strip and batch goes on a grid canvas.
+    Strips in `strips` are shared by every page, `page_strips` holds the strips that only apply to one page.
+    """
+    def __init__(
+            self,
+            width: int,
+            height: int,
+            image_h: int,
+            image_w: int,
+            batch_size: int,
+            batch_stack_direction: str,
+    ) -> None:
+        self.width = width
+        self.height = height
+        self.image_h = image_h
+        self.image_w = image_w
+        self.batch_size = batch_size
+        self.batch_stack_direction = batch_stack_direction
+        self.strips: List[LabelStrip] = []
+        self.page_strips: List[List[LabelStrip]] = []
+        self.cells: List[GridCell] = []
+
+    @property
+    def num_pages(self) -> int:
+        return max(len(self.page_strips), 1)
+
+    def strips_for_page(self, page_idx: int) -> List[LabelStrip]:
+        if page_idx < len(self.page_strips):
+            return self.strips + self.page_strips[page_idx]
+        return self.strips
+
+
+class CellFingerprint(NamedTuple):
+    """
+    Content hash of the batch drawn in a cell. `ref`/`version` identify the exact tensor it was computed from,
+    so an unchanged tensor that is passed again doesn't have to be hashed again.
+    """
+    digest: Tuple[Any, ...]
+    ref: Any
+    version: int
+
+
+def batch_fingerprint(batch: Tensor, previous: Optional[CellFingerprint] = None) -> CellFingerprint:
+    if previous is not None and previous.ref() is batch and previous.version == batch._version:
+        return previous
+    data = batch.detach().cpu().contiguous()
+    digest = hashlib.blake2b(data.flatten().view(torch.uint8).numpy().data, digest_size=16).digest()
+    return CellFingerprint((tuple(data.shape), str(data.dtype), digest), weakref.ref(batch), batch._version)
+
+
+class PageState(NamedTuple):
+    """
+    A composited page together with what it was rendered from, used to repaint only what changed
+    """
+    layout_key: Tuple[Any, ...]
+    strips: List[LabelStrip]
+    fingerprints: List[CellFingerprint]
+    canvas: Tensor
+
+
+def _paste(target: Tensor, top: int, left: int, src: Tensor, y: int, x: int, to_uint8: bool = False) -> None:
+    """
+    Copies src (placed at canvas position x/y) into the part of target that it overlaps.
+    target covers the canvas region starting at top/left.
+    With to_uint8, float src in 0..1 is scaled and clipped for a uint8 target (truncating like tensor2pil).
+    """
+    t_h, t_w = target.shape[0], target.shape[1]
+    s_h, s_w = src.shape[0], src.shape[1]
+    y0, y1 = max(y, top), min(y + s_h, top + t_h)
+    x0, x1 = max(x, left), min(x + s_w, left + t_w)
+    if y0 >= y1 or x0 >= x1:
+        return
+
+    region = target[y0 - top:y1 - top, x0 - left:x1 - left]
+    src = src[y0 - y:y1 - y, x0 - x:x1 - x]
+    if to_uint8:
+        src = src.mul(255.0).clamp_(0.0, 255.0)
+    region.copy_(src)
+
+
+def _fill(target: Tensor, top: int, left: int, y: int, x: int, h: int, w: int, value: float) -> None:
+    t_h, t_w = target.shape[0], target.shape[1]
+    y0, y1 = max(y, top), min(y + h, top + t_h)
+    x0, x1 = max(x, left), min(x + w, left + t_w)
+    if y0 >= y1 or x0 >= x1:
+        return
+    target[y0 - top:y1 - top, x0 - left:x1 - left] = value
+
+
+def _as_rgb(img: Tensor) -> Tensor:
+    if img.shape[-1] == 1:
+        return img.expand(-1, -1, 3)
+    return img[..., :3]
+
+
+CANVAS_DTYPES = {
+    "float32": torch.float32,
+    "float16": torch.float16,
+    "uint8": torch.uint8,
+}
+
+
+class GridCompositor:
+    """
+    Writes label strips and image batches directly into a preallocated canvas tensor.
+    Any rectangular region of a page can be rendered on its own, the full page is just the largest region.
+    Canvases are float32 by default, float16 and uint8 (0..255) canvases take a half/quarter of the memory
+    and images are converted cell by cell while they are written.
+    """
+    def __init__(
+            self,
+            layout: GridLayout,
+            label_color: str,
+            dtype: torch.dtype = torch.float32,
+            memmap_dir: Optional[Path] = None,
+    ) -> None:
+        """
+        :param memmap_dir: Directory of the memmaps of tiled and exported renders, see memmap_tensor
+        """
+        self.layout = layout
+        self.label_color = label_color
+        self.dtype = dtype
+        self.memmap_dir = memmap_dir
+        self.is_uint8 = dtype == torch.uint8
+
+    def render_page(self, batches: Sequence[Tensor], page_idx: int = 0) -> Tensor:
+        """
+        :param batches: Batches of the page, indexed by GridCell.batch_idx
+        :param page_idx:
+        :return: Tensor [1, H, W, 3]
+        """
+        canvas = torch.empty((1, self.layout.height, self.layout.width, 3), dtype=self.dtype)
+        self.render_region(canvas[0], batches, page_idx, 0, 0)
+        return canvas
+
+    def prerender_labels(self, executor: Executor) -> None:
+        """
+        Renders the bitmaps of the label strips of every page into the label cache, so pages and bands
+        rendered afterwards only copy them
+        """
+        strips = set(self.layout.strips)
+        for page_strips in self.layout.page_strips:
+            strips.update(page_strips)
+        for future in [executor.submit(self._strip_pixels, strip) for strip in strips]:
+            future.result()
+
+    def render_pages(self, pages: Sequence[Sequence[Tensor]], executor: Executor, workers: int) -> List[Tensor]:
+        """
+        Renders several pages concurrently. Every page is split into row bands, so a single page
+        also uses more than one worker. Bands of all pages are independent regions of their canvases.
+        :param pages: Batches of every page, indexed by GridCell.batch_idx
+        :param executor: Pool the labels and bands are rendered on
+        :param workers: Number of workers of executor, used to size the bands
+        :return: Tensor [1, H, W, 3] per page, in the order of pages
+        """
+        self.prerender_labels(executor)
+
+        height, width = self.layout.height, self.layout.width
+        # A few bands per worker keep the pool busy when bands take uneven time
+        bands_per_page = max(1, math.ceil(workers * 4 / max(len(pages), 1)))
+        band_h = max(1, math.ceil(height / bands_per_page))
+
+        canvases = [torch.empty((1, height, width, 3), dtype=self.dtype) for _ in pages]
+        futures = []
+        for page_idx, (canvas, batches) in enumerate(zip(canvases, pages)):
+            # Loaded while the bands of the previous pages render
+            cells = page_cells(batches)
+            futures.extend(
+                executor.submit(self.render_region, canvas[0, top:top + band_h], cells, page_idx, top, 0)
+                for top in range(0, height, band_h)
+            )
+        for future in futures:
+            future.result()
+        return canvases
+
+    def layout_key(self) -> Tuple[Any, ...]:
+        layout = self.layout
+        return (
+            layout.width, layout.height, layout.image_h, layout.image_w, layout.batch_size,
+            layout.batch_stack_direction, self.label_color, self.dtype, tuple(layout.cells),
+        )
+
+    def render_page_incremental(
+            self, batches: Sequence[Tensor], page_idx: int, previous: Optional[PageState]
+    ) -> PageState:
+        """
+        Renders the page by repainting only the strips and cells that differ from the previous render of it.
+        Falls back to a full render when there is no previous render or the layout changed.
+        :param batches: Batches of the page, indexed by GridCell.batch_idx
+        :param page_idx:
+        :param previous: State returned by the last render of this page
+        :return: New state, its canvas is a new tensor [1, H, W, 3]
+        """
+        batches = page_cells(batches)
+        layout_key = self.layout_key()
+        strips = self.layout.strips_for_page(page_idx)
+        if previous is None or previous.layout_key != layout_key or len(previous.strips) != len(strips):
+            fingerprints = [batch_fingerprint(batches[cell.batch_idx]) for cell in self.layout.cells]
+            return PageState(layout_key, strips, fingerprints, self.render_page(batches, page_idx))
+
+        # The previous canvas may still be referenced by earlier outputs, so it is never changed in place
+        canvas = previous.canvas.clone()
+        for strip, previous_strip in zip(strips, previous.strips):
+            if strip != previous_strip:
+                # Both rects, in case the strip moved
+                for changed in (previous_strip, strip):
+                    strip_h, strip_w = (changed.width, changed.height) if changed.rotate else (changed.height, changed.width)
+                    self._render_rect(canvas, batches, page_idx, changed.y, changed.x, strip_h, strip_w)
+
+        cell_h, cell_w = self.cell_size()
+        fingerprints = []
+        for cell, previous_fingerprint in zip(self.layout.cells, previous.fingerprints):
+            fingerprint = batch_fingerprint(batches[cell.batch_idx], previous_fingerprint)
+            if fingerprint.digest != previous_fingerprint.digest:
+                self._render_rect(canvas, batches, page_idx, cell.y, cell.x, cell_h, cell_w)
+            fingerprints.append(fingerprint)
+        return PageState(layout_key, strips, fingerprints, canvas)
+
+    def _render_rect(
+            self, canvas: Tensor, batches: Sequence[Tensor], page_idx: int, y: int, x: int, h: int, w: int
+    ) -> None:
+        y0, y1 = max(y, 0), min(y + h, self.layout.height)
+        x0, x1 = max(x, 0), min(x + w, self.layout.width)
+        if y0 < y1 and x0 < x1:
+            self.render_region(canvas[0, y0:y1, x0:x1], batches, page_idx, y0, x0)
+
+    def cell_size(self) -> Tuple[int, int]:
+        layout = self.layout
+        if layout.batch_stack_direction == "horizontal":
+            return layout.image_h, layout.image_w * layout.batch_size
+        return layout.image_h * layout.batch_size, layout.image_w
+
+    def tile_regions(self, tile_size: int) -> Iterator[Tuple[int, int, int, int]]:
+        """
+        :param tile_size:
+        :return: Iterator of (top, left, height, width) covering the page row by row
+        """
+        for top in range(0, self.layout.height, tile_size):
+            for left in range(0, self.layout.width, tile_size):
+                yield top, left, min(tile_size, self.layout.height - top), min(tile_size, self.layout.width - left)
+
+    def tile_grid(self, tile_size: int) -> Tuple[int, int]:
+        """
+        :return: (rows, columns) of the tiles yielded by tile_regions
+        """
+        return math.ceil(self.layout.height / tile_size), math.ceil(self.layout.width / tile_size)
+
+    def render_tiles(self, batches: Sequence[Tensor], page_idx: int, tile_size: int) -> Iterator[Tensor]:
+        """
+        Renders the page as separate tiles. Every tile is backed by its own memmap, so finished tiles can be
+        paged out and only the tile being rendered has to be resident.
+        :return: Iterator of Tensor [1, h, w, 3], row by row
+        """
+        batches = page_cells(batches)
+        for top, left, height, width in self.tile_regions(tile_size):
+            tile = memmap_tensor((1, height, width, 3), self.dtype, self.memmap_dir)
+            self.render_region(tile[0], batches, page_idx, top, left)
+            yield tile
+
+    def render_page_memmap(self, batches: Sequence[Tensor], page_idx: int, tile_size: int) -> Tensor:
+        """
+        Renders the page tile by tile into a memmap on disk, with the dtype of the canvas
+        :return: Tensor [1, H, W, 3] backed by the memmap
+        """
+        batches = page_cells(batches)
+        canvas = memmap_tensor((1, self.layout.height, self.layout.width, 3), self.dtype, self.memmap_dir)
+        for top, left, height, width in self.tile_regions(tile_size):
+            self.render_region(canvas[0, top:top + height, left:left + width], batches, page_idx, top, left)
+        return canvas
+
+    def render_region(
+            self,
+            target: Tensor,
+            batches: Sequence[Tensor],
+            page_idx: int,
+            top: int,
+            left: int,
+    ) -> Tensor:
+        """
+        Renders the region of the page starting at top/left with the size of target
+        :param target: Tensor [h, w, 3] that receives the region
+        :param batches: Batches of the page, indexed by GridCell.batch_idx
+        :param page_idx:
+        :param top:
+        :param left:
+        :return: target
+        """
+        layout = self.layout
+        target.fill_(255 if self.is_uint8 else 1.0)
+
+        for strip in layout.strips_for_page(page_idx):
+            strip_h, strip_w = (strip.width, strip.height) if strip.rotate else (strip.height, strip.width)
+            if not self._overlaps(target, top, left, strip.y, strip.x, strip_h, strip_w):
+                continue
+            _paste(target, top, left, self._strip_pixels(strip), strip.y, strip.x)
+
+        cell_h, cell_w = self.cell_size()
+        for cell in layout.cells:
+            if not self._overlaps(target, top, left, cell.y, cell.x, cell_h, cell_w):
+                continue
+            self._write_cell(target, top, left, batches[cell.batch_idx], cell, cell_h, cell_w)
+
+        return target
+
+    def _strip_pixels(self, strip: LabelStrip) -> Tensor:
+        if self.is_uint8:
+            # Label bitmaps are uint8 already, no conversion needed
+            return render_label(strip.text, strip.size, self.label_color, strip.rotate, strip.width, strip.height, strip.text_x)
+        return render_label_strip(strip, self.label_color)
+
+    @staticmethod
+    def _overlaps(target: Tensor, top: int, left: int, y: int, x: int, h: int, w: int) -> bool:
+        return y < top + target.shape[0] and y + h > top and x < left + target.shape[1] and x + w > left
+
+    def _write_cell(
+            self,
+            target: Tensor,
+            top: int,
+            left: int,
+            batch: Tensor,
+            cell: GridCell,
+            cell_h: int,
+            cell_w: int,
+    ) -> None:
+        layout = self.layout
+        _, img_h, img_w, _ = batch.shape
+        if len(batch) < layout.batch_size or img_h < layout.image_h or img_w < layout.image_w:
+            # Parts of the cell not covered by an image stay black
+            _fill(target, top, left, cell.y, cell.x, cell_h, cell_w, 0.0)
+
+        for img_idx, img in enumerate(batch[:layout.batch_size]):
+            if layout.batch_stack_direction == "horizontal":
+                x, y = cell.x + layout.image_w * img_idx, cell.y
+            else:
+                x, y = cell.x, cell.y + layout.image_h * img_idx
+            _paste(target, top, left, _as_rgb(img[:layout.image_h, :layout.image_w]), y, x, self.is_uint8)
+
+        if self.is_uint8:
+            # Already clipped while converting
+            return
+
+        # Clamp only the part of the cell that was written
+        y0, y1 = max(cell.y, top) - top, min(cell.y + cell_h, top + target.shape[0]) - top
+        x0, x1 = max(cell.x, left) - left, min(cell.x + cell_w, left + target.shape[1]) - left
+        target[y0:y1, x0:x1].clamp_(0.0, 1.0)
+
@@ -0,0 +1,231 @@
+"""
+Minimal graph executor that applies ComfyUI's INPUT_IS_LIST/OUTPUT_IS_LIST semantics, so the nodes of this package
+can be run and profiled without ComfyUI.
+
+Graphs use the ComfyUI API prompt format:
+    {"1": {"class_type": "Range(Step) - Int", "inputs": {"start": 0, "stop": 10, "step": 1, "end_mode": "Inclusive"}},
+     "2": {"class_type": "List Length", "inputs": {"In": ["1", 0]}}}
+
+Usage:
+    python -m custom_nodes.Comfy_KepListStuff.executor graph.json --report report.json
+or, without a ComfyUI checkout, directly from the package directory:
+    python executor.py graph.json
+"""
+import argparse
+import importlib.util
+import json
+import resource
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+PACKAGE_NAME = "custom_nodes.Comfy_KepListStuff"
+
+Graph = Dict[str, Dict[str, Any]]
+
+
+def ensure_package_importable() -> None:
+    """
+    Registers this directory as custom_nodes.Comfy_KepListStuff when it is not already importable under that name,
+    which is the case when running outside a ComfyUI checkout.
+    """
+    if PACKAGE_NAME in sys.modules:
+        return
+    try:
+        importlib.import_module(PACKAGE_NAME)
+        return
+    except ImportError:
+        pass
+
+    package_dir = Path(__file__).parent
+    if "custom_nodes" not in sys.modules:
+        custom_nodes = types.ModuleType("custom_nodes")
+        custom_nodes.__path__ = []
+        sys.modules["custom_nodes"] = custom_nodes
+
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME, package_dir / "__init__.py", submodule_search_locations=[str(package_dir)]
+    )
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = module
+    spec.loader.exec_module(module)
+
+
+def _current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # ru_maxrss is in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RssSampler:
+    """
+    Samples the resident set size on a background thread to find the peak while a node runs
+    """
+    def __init__(self, interval: float = 0.001) -> None:
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self.peak = _current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _current_rss())
+
+
+def _is_link(value: Any) -> bool:
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[0], str) and isinstance(value[1], int)
+
+
+def _size_in_bytes(value: Any) -> int:
+    import torch
+
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    return 0
+
+
+def map_node_over_list(node: Any, function: str, inputs: Dict[str, List[Any]]) -> List[Tuple[Any, ...]]:
+    """
+    Calls the node function the way ComfyUI does: once with the full lists if INPUT_IS_LIST,
+    otherwise once per index of the longest input with shorter inputs repeating their last value.
+    """
+    if getattr(node, "INPUT_IS_LIST", False):
+        return [getattr(node, function)(**inputs)]
+
+    max_len = max((len(value) for value in inputs.values()), default=1)
+    results = []
+    for i in range(max_len):
+        results.append(getattr(node, function)(**{
+            name: value[i if len(value) > i else -1] for name, value in inputs.items()
+        }))
+    return results
+
+
+def collect_outputs(node: Any, results: List[Tuple[Any, ...]]) -> List[Sequence[Any]]:
+    """
+    Merges the results of every call into one list per output slot
+    """
+    num_outputs = len(node.RETURN_TYPES)
+    output_is_list = getattr(node, "OUTPUT_IS_LIST", (False,) * num_outputs)
+    outputs: List[Sequence[Any]] = []
+    for slot in range(num_outputs):
+        if slot < len(output_is_list) and output_is_list[slot]:
+            # Copied with extend like ComfyUI's merge_result_data, which iterates lazy sequences
+            merged: List[Any] = []
+            for result in results:
+                merged.extend(result[slot])
+            outputs.append(merged)
+        else:
+            outputs.append([result[slot] for result in results])
+    return outputs
+
+
+class GraphExecutor:
+    def __init__(self, graph: Graph, node_class_mappings: Optional[Dict[str, Any]] = None) -> None:
+        if node_class_mappings is None:
+            ensure_package_importable()
+            node_class_mappings = importlib.import_module(PACKAGE_NAME).NODE_CLASS_MAPPINGS
+        self.graph = graph
+        self.node_class_mappings = node_class_mappings
+        self.outputs: Dict[str, List[Sequence[Any]]] = {}
+        self.report: List[Dict[str, Any]] = []
+
+    def execute(self) -> Dict[str, List[Sequence[Any]]]:
+        for node_id in self.graph:
+            self._execute_node(node_id, [])
+        return self.outputs
+
+    def _execute_node(self, node_id: str, stack: List[str]) -> List[Sequence[Any]]:
+        if node_id in self.outputs:
+            return self.outputs[node_id]
+        if node_id in stack:
+            raise Exception(f"Cycle detected at node {node_id}")
+        if node_id not in self.graph:
+            raise Exception(f"Unknown node {node_id}")
+
+        node_def = self.graph[node_id]
+        class_type = node_def["class_type"]
+        if class_type not in self.node_class_mappings:
+            raise Exception(f"Unknown class_type {class_type} for node {node_id}")
+
+        inputs: Dict[str, List[Any]] = {}
+        for name, value in node_def.get("inputs", {}).items():
+            if _is_link(value):
+                source_outputs = self._execute_node(value[0], stack + [node_id])
+                inputs[name] = source_outputs[value[1]]
+            else:
+                inputs[name] = [value]
+
+        node_class = self.node_class_mappings[class_type]
+        node = node_class()
+
+        start = time.perf_counter()
+        with RssSampler() as sampler:
+            results = map_node_over_list(node, node_class.FUNCTION, inputs)
+        wall = time.perf_counter() - start
+
+        outputs = collect_outputs(node, results)
+        self.outputs[node_id] = outputs
+        self.report.append({
+            "id": node_id,
+            "class_type": class_type,
+            "calls": len(results),
+            "wall_s": wall,
+            "peak_rss_mb": sampler.peak / (1024 * 1024),
+            "outputs": [
+                {
+                    "name": name,
+                    "items": len(output),
+                    "bytes": sum(_size_in_bytes(item) for item in output) if isinstance(output, list) else None,
+                }
+                for name, output in zip(getattr(node, "RETURN_NAMES", node.RETURN_TYPES), outputs)
+            ],
+        })
+        return outputs
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a graph of Comfy_KepListStuff nodes without ComfyUI")
+    parser.add_argument("graph", help="Graph JSON in the ComfyUI API prompt format")
+    parser.add_argument("--report", help="JSON file to write the per node report to")
+    args = parser.parse_args(argv)
+
+    with open(args.graph) as f:
+        graph = json.load(f)
+
+    executor = GraphExecutor(graph)
+    executor.execute()
+
+    for entry in executor.report:
+        sizes = ", ".join(f"{o['name']}={o['items']}" for o in entry["outputs"])
+        print(
+            f"{entry['id']:>4} {entry['class_type']:<28} {entry['wall_s'] * 1000:>10.2f} ms"
+            f" {entry['peak_rss_mb']:>9.1f} MB  {sizes}"
+        )
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(executor.report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Optional, Sequence
+
+import numpy as np
+import torch
+from PIL import Image
+from torch import Tensor
+
+from custom_nodes.Comfy_KepListStuff.compositor import GridCompositor, memmap_tensor, page_cells
+from custom_nodes.Comfy_KepListStuff.utils import UInt8Buffer, resize_batch, uint82tensor
+
+EXPORT_FORMATS = {
+    "png": ".png",
+    "webp": ".webp",
+    "jpeg": ".jpg",
+}
+
+# Largest width/height each format can store
+EXPORT_SIZE_LIMITS = {
+    "png": 2 ** 31 - 1,
+    "webp": 16383,
+    "jpeg": 65535,
+}
+
+
+class PngStreamWriter:
+    """
+    Writes an 8-bit RGB PNG row band by row band, so the image never has to exist in memory as a whole.
+    Rows use the Sub filter and are deflated as they come in, the file is moved into place on close.
+    """
+    SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+    def __init__(self, path: Path, width: int, height: int, compress_level: int = 6) -> None:
+        self.path = path
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        self._file: BinaryIO = open(self._tmp, "wb")
+        self._compressor = zlib.compressobj(compress_level)
+        self._file.write(self.SIGNATURE)
+        # 8 bit depth, color type 2 (RGB), default compression, filtering and no interlacing
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, tag: bytes, data: bytes) -> None:
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(tag)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(tag)) & 0xFFFFFFFF))
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        """
+        :param rows: uint8 array [h, width, 3] of the next rows
+        """
+        rows = rows.reshape(rows.shape[0], self.width * 3)
+        filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        # Sub filter: difference to the same channel of the pixel to the left, wrapping like uint8
+        filtered[:, 0] = 1
+        filtered[:, 1:4] = rows[:, :3]
+        np.subtract(rows[:, 3:], rows[:, :-3], out=filtered[:, 4:])
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+        self.rows_written += rows.shape[0]
+
+    def close(self) -> None:
+        if self.rows_written != self.height:
+            self.abort()
+            raise Exception(f"PNG {self.path} got {self.rows_written} rows, expected {self.height}")
+        self._chunk(b"IDAT", self._compressor.flush())
+        self._chunk(b"IEND", b"")
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        self._tmp.unlink(missing_ok=True)
+
+
+def _write_preview_rows(preview: Tensor, band: Tensor, top: int, height: int, scale: float) -> None:
+    """
+    Writes the area-downscaled rows of the preview covered by a band starting at canvas row top
+    """
+    preview_h, preview_w = preview.shape[:2]
+    start = min(int(top * scale), preview_h)
+    stop = preview_h if top + band.shape[0] >= height else min(int((top + band.shape[0]) * scale), preview_h)
+    if stop > start:
+        preview[start:stop] = resize_batch(uint82tensor(band).unsqueeze(0), stop - start, preview_w)[0]
+
+
+def _save_mapped(canvas: Tensor, path: Path, export_format: str, quality: int) -> None:
+    """
+    Encodes an RGBX memmap through a PIL image mapped onto it, the file is moved into place once complete
+    """
+    height, width = canvas.shape[:2]
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with Image.frombuffer("RGBX", (width, height), canvas.numpy(), "raw", "RGBX", 0, 1) as image:
+            image.save(tmp, "JPEG" if export_format == "jpeg" else "WEBP", quality=quality)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def export_page(
+        compositor: GridCompositor,
+        batches: Sequence[Tensor],
+        page_idx: int,
+        path: Path,
+        export_format: str,
+        band_height: int,
+        quality: int = 95,
+        preview_size: int = 0,
+) -> Optional[Tensor]:
+    """
+    Renders a page band by band straight into an image file.
+    PNG is encoded while rendering, only one band is in memory at a time. PIL can't encode WebP and JPEG
+    incrementally, so their bands go to an RGBX memmap first, which PIL maps without copying.
+    JPEG is then encoded row by row from the memmap. libwebp has no incremental API and converts the whole
+    page into its own buffer, so WebP needs about a page of RAM while encoding.
+    :param compositor: Compositor with a uint8 canvas
+    :param batches: Batches of the page, indexed by GridCell.batch_idx
+    :param page_idx:
+    :param path: Output file
+    :param export_format: "png", "webp" or "jpeg"
+    :param band_height: Rows rendered at a time
+    :param quality: WebP/JPEG quality
+    :param preview_size: Largest side of the returned preview, 0 for no preview
+    :return: Preview Tensor [1, h, w, 3] or None
+    """
+    if not compositor.is_uint8:
+        raise ValueError("export_page needs a compositor with a uint8 canvas")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format}")
+
+    height, width = compositor.layout.height, compositor.layout.width
+    if max(height, width) > EXPORT_SIZE_LIMITS[export_format]:
+        raise Exception(
+            f"{export_format} supports at most {EXPORT_SIZE_LIMITS[export_format]} pixels per side, "
+            f"the grid is {width}x{height}. Use png for larger grids."
+        )
+    band_height = max(1, min(band_height, height))
+    batches = page_cells(batches)
+
+    # Allocated up front, small allocations kept between bands would pin the freed band buffers in the heap
+    preview: Optional[Tensor] = None
+    scale = 0.0
+    if preview_size > 0:
+        scale = min(preview_size / max(height, width), 1.0)
+        preview = torch.empty((max(1, round(height * scale)), max(1, round(width * scale)), 3))
+
+    png: Optional[PngStreamWriter] = None
+    canvas: Optional[Tensor] = None
+    if export_format == "png":
+        png = PngStreamWriter(path, width, height)
+    else:
+        # The padding byte makes the layout one PIL can map, RGB buffers are always copied
+        canvas = memmap_tensor((height, width, 4), torch.uint8, compositor.memmap_dir)
+
+    buffer = UInt8Buffer()
+    try:
+        for top in range(0, height, band_height):
+            band_h = min(band_height, height - top)
+            if canvas is not None:
+                band = canvas[top:top + band_h, :, :3]
+            else:
+                band = buffer.get((band_h, width, 3))
+            compositor.render_region(band, batches, page_idx, top, 0)
+            if png is not None:
+                png.write_rows(band.numpy())
+            if preview is not None:
+                _write_preview_rows(preview, band, top, height, scale)
+
+        if png is not None:
+            png.close()
+        elif canvas is not None:
+            _save_mapped(canvas, path, export_format, quality)
+    except Exception:
+        if png is not None:
+            png.abort()
+        raise
+
+    if preview is None:
+        return None
+    return preview.unsqueeze(0)
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import matplotlib.font_manager as fm
+import numpy as np
+import torch
+from PIL import Image, ImageDraw, ImageFont
+from torch import Tensor
+
+
+@lru_cache(maxsize=None)
+def get_font(size: int, family: Optional[str] = None) -> ImageFont.FreeTypeFont:
+    """
+    Process wide font cache, findfont and truetype both hit the filesystem so only do it once per (family, size)
+    :param size:
+    :param family: Font family passed to matplotlib, None uses the matplotlib default
+    :return:
+    """
+    return ImageFont.truetype(fm.findfont(fm.FontProperties(family=family)), size)
+
+
+LabelKey = Tuple[str, int, str, bool, int, int, float]
+
+
+class LabelCache:
+    """
+    Bounded LRU of rendered label bitmaps, stored as uint8 tensors [H, W, 3]
+    """
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[LabelKey, Tensor]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: LabelKey) -> Optional[Tensor]:
+        with self._lock:
+            bitmap = self._entries.get(key)
+            if bitmap is not None:
+                self._entries.move_to_end(key)
+            return bitmap
+
+    def put(self, key: LabelKey, bitmap: Tensor) -> None:
+        size = bitmap.numel() * bitmap.element_size()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.numel() * old.element_size()
+            self._entries[key] = bitmap
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.numel() * evicted.element_size()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+label_cache = LabelCache(max_bytes=64 * 1024 * 1024)
+
+
+def render_label(
+        text: str,
+        size: int,
+        color: str,
+        rotate: bool,
+        width: int,
+        height: int,
+        text_x: float,
+) -> Tensor:
+    """
+    Renders text centered at the top of a white width x height strip, rotated 90 degrees if requested.
+    Results are shared through label_cache and must not be modified.
+    :return: uint8 Tensor [H, W, 3] of the (rotated) strip
+    """
+    key = (text, size, color, rotate, width, height, text_x)
+    bitmap = label_cache.get(key)
+    if bitmap is not None:
+        return bitmap
+
+    img_txt = Image.new("RGB", (width, height), color="#ffffff")
+    draw_txt = ImageDraw.Draw(img_txt)
+    draw_txt.text((text_x, 0), text, anchor='ma', fill=color, font=get_font(size))
+    if rotate:
+        img_txt = img_txt.rotate(90, expand=True)
+    bitmap = torch.from_numpy(np.array(img_txt))
+    label_cache.put(key, bitmap)
+    return bitmap
+
+
+def render_text_mask(text: str, size: int, max_width: int, max_height: int) -> Tensor:
+    """
+    Renders the coverage mask of text drawn at (0, 0) with the default left/ascender anchor.
+    Results are shared through label_cache and must not be modified.
+    :return: uint8 Tensor [H, W] cropped to the text bounds and max_width x max_height
+    """
+    _, _, right, bottom = get_font(size).getbbox(text)
+    width, height = max(min(right, max_width), 1), max(min(bottom, max_height), 1)
+    key = (text, size, "mask", False, width, height, 0.0)
+    mask = label_cache.get(key)
+    if mask is not None:
+        return mask
+
+    img_mask = Image.new("L", (width, height), color=0)
+    ImageDraw.Draw(img_mask).text((0, 0), text, fill=255, font=get_font(size))
+    mask = torch.from_numpy(np.array(img_mask))
+    label_cache.put(key, mask)
+    return mask
@@ -0,0 +1,267 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union, overload
+
+import numpy as np
+import torch
+from PIL import Image
+from torch import Tensor
+
+from custom_nodes.Comfy_KepListStuff.utils import uint82tensor
+
+
+def _decode_file(file: Path) -> np.ndarray:
+    try:
+        with Image.open(file) as img:
+            return np.array(img)
+    except Exception as e:
+        raise Exception(f"Failed to load image {file}: {e}") from e
+
+
+class DecodedImageCache:
+    """
+    On-disk cache of decoded images stored as uint8 .npy files, which are memory-mapped on load.
+    Entries are keyed on the source path, size and mtime, so modified files are decoded again.
+    The cache is bounded by max_bytes, evicting the least recently used entries first.
+    """
+    def __init__(self, cache_dir: Path, max_bytes: int) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, file: Path) -> Path:
+        stat = file.stat()
+        key = f"{file.resolve()}|{stat.st_size}|{stat.st_mtime_ns}"
+        return self.cache_dir / f"{hashlib.sha1(key.encode()).hexdigest()}.npy"
+
+    def get(self, file: Path) -> Optional[np.ndarray]:
+        entry = self._entry_path(file)
+        try:
+            arr = np.load(entry, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        # The entry mtime doubles as last access time for eviction
+        os.utime(entry)
+        return arr
+
+    def put(self, file: Path, arr: np.ndarray) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry = self._entry_path(file)
+        tmp = entry.with_name(f"{entry.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp, entry)
+
+    def load(self, file: Path) -> np.ndarray:
+        arr = self.get(file)
+        if arr is None:
+            arr = _decode_file(file)
+            self.put(file, arr)
+        return arr
+
+    def evict(self) -> None:
+        if not self.cache_dir.is_dir():
+            return
+        entries = []
+        for entry in self.cache_dir.glob("*.npy"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                entry.unlink()
+            except OSError:
+                continue
+            total -= size
+
+
+def default_cache_dir() -> Path:
+    return Path(tempfile.gettempdir()) / "Comfy_KepListStuff" / "decoded_images"
+
+
+def decode_image(file: Path, cache: Optional[DecodedImageCache] = None) -> np.ndarray:
+    """
+    Decodes a single image file. Module level so it can be sent to process pool workers.
+    :param file:
+    :param cache: Optional cache to read the decoded image from/store it in
+    :return: uint8 array [H, W, C], memory-mapped when it came from the cache
+    """
+    if cache is not None:
+        return cache.load(file)
+    return _decode_file(file)
+
+
+def array2tensor(arr: np.ndarray) -> Tensor:
+    return uint82tensor(arr).unsqueeze(0)
+
+
+def load_image(file: Path, cache: Optional[DecodedImageCache] = None) -> Tensor:
+    return array2tensor(decode_image(file, cache))
+
+
+def load_images(
+        files: Sequence[Path],
+        workers: int = 1,
+        worker_type: str = "thread",
+        cache: Optional[DecodedImageCache] = None,
+) -> List[Tensor]:
+    """
+    Loads images in the order of files, decoding on a pool of workers.
+    PIL releases the GIL while decoding, so threads are usually enough. Process workers only decode,
+    the float conversion happens in the calling process to avoid pickling float tensors.
+    Process workers are spawned, forking ComfyUI's multi-threaded process after CUDA is initialized is unsafe.
+    :param files:
+    :param workers: Number of workers, 1 decodes serially on the calling thread
+    :param worker_type: "thread" or "process"
+    :param cache: Optional decoded image cache, evicted once all files are loaded
+    :return: List of Tensor [1, H, W, C]
+    """
+    images: List[Tensor]
+    executor: Executor
+    if workers <= 1 or len(files) <= 1:
+        images = [load_image(file, cache) for file in files]
+    elif worker_type == "thread":
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            images = list(executor.map(partial(load_image, cache=cache), files))
+    elif worker_type == "process":
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            decoded = executor.map(partial(decode_image, cache=cache), files, chunksize=8)
+            images = [array2tensor(arr) for arr in decoded]
+    else:
+        raise ValueError(f"Unknown worker type {worker_type}")
+
+    if cache is not None:
+        cache.evict()
+    return images
+
+
+def pack_by_resolution(images: Sequence[Tensor], max_batch_size: int) -> Tuple[List[Tensor], List[int]]:
+    """
+    Groups images with the same shape into batches of at most max_batch_size.
+    Buckets are emitted in the order their first image appears.
+    :param images: List of Tensor [1, H, W, C]
+    :param max_batch_size:
+    :return: (batches, indices) where indices[k] is the original index of the k-th packed image
+    """
+    buckets: Dict[Tuple[int, ...], List[int]] = {}
+    for idx, image in enumerate(images):
+        buckets.setdefault(tuple(image.shape[1:]), []).append(idx)
+
+    batches: List[Tensor] = []
+    indices: List[int] = []
+    for bucket in buckets.values():
+        for start in range(0, len(bucket), max_batch_size):
+            chunk = bucket[start:start + max_batch_size]
+            batches.append(torch.cat([images[idx] for idx in chunk]))
+            indices.extend(chunk)
+    return batches, indices
+
+
+def read_image_shape(file: Path) -> Tuple[int, ...]:
+    """
+    Reads the shape the decoded array of file will have, only the image header is read
+    :param file:
+    :return: (H, W) for single band images, (H, W, C) otherwise
+    """
+    try:
+        with Image.open(file) as img:
+            bands = len(img.getbands())
+            width, height = img.size
+    except Exception as e:
+        raise Exception(f"Failed to load image {file}: {e}") from e
+    if bands == 1:
+        return height, width
+    return height, width, bands
+
+
+class LazyImageList(Sequence[Tensor]):
+    """
+    Read-only list of images that are only decoded when accessed.
+    The length and the shape of every image are known up front. Sequential access, forwards or backwards,
+    prefetches the next `prefetch` images in its direction on a background thread, random access doesn't prefetch.
+    Slicing and repeating return new lazy lists without decoding.
+    """
+    def __init__(
+            self,
+            files: Sequence[Path],
+            cache: Optional[DecodedImageCache] = None,
+            prefetch: int = 4,
+            shapes: Optional[Sequence[Tuple[int, ...]]] = None,
+    ) -> None:
+        self.files = list(files)
+        self.cache = cache
+        self.prefetch = prefetch
+        self.shapes = list(shapes) if shapes is not None else [read_image_shape(file) for file in self.files]
+        self._pending: Dict[int, "Future[Tensor]"] = {}
+        self._last_idx: Optional[int] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def tensor_shape(self, idx: int) -> Tuple[int, ...]:
+        return (1,) + self.shapes[idx]
+
+    @overload
+    def __getitem__(self, idx: int) -> Tensor: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> "LazyImageList": ...
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[Tensor, "LazyImageList"]:
+        if isinstance(idx, slice):
+            indices = range(len(self))[idx]
+            return LazyImageList(
+                [self.files[i] for i in indices], self.cache, self.prefetch, [self.shapes[i] for i in indices]
+            )
+
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("LazyImageList index out of range")
+
+        with self._lock:
+            future = self._pending.pop(idx, None)
+            step = idx - self._last_idx if self._last_idx is not None else 0
+            self._last_idx = idx
+            self._schedule_prefetch(idx, step if step in (1, -1) else 0)
+        if future is not None:
+            return future.result()
+        return load_image(self.files[idx], self.cache)
+
+    def __mul__(self, count: int) -> "LazyImageList":
+        return LazyImageList(self.files * count, self.cache, self.prefetch, self.shapes * count)
+
+    __rmul__ = __mul__
+
+    def _schedule_prefetch(self, idx: int, step: int) -> None:
+        """
+        Prefetches the `prefetch` images following idx in the direction of step and cancels the other prefetches
+        :param idx: Index that was just accessed
+        :param step: 1 or -1 for sequential access, 0 only cancels
+        """
+        wanted = [] if step == 0 else [
+            i for i in range(idx + step, idx + step * (self.prefetch + 1), step) if 0 <= i < len(self)
+        ]
+        for pending_idx in list(self._pending):
+            if pending_idx not in wanted:
+                self._pending.pop(pending_idx).cancel()
+        if not wanted:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="LazyImageList")
+        for wanted_idx in wanted:
+            if wanted_idx not in self._pending:
+                self._pending[wanted_idx] = self._executor.submit(load_image, self.files[wanted_idx], self.cache)
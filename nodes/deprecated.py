@@ -1,10 +1,10 @@
 from typing import Dict, Any, List, Optional, Tuple
 
-from PIL import ImageFont, Image, ImageDraw
+from PIL import Image, ImageDraw
 from torch import Tensor
-import matplotlib.font_manager as fm
 
-from custom_nodes.Comfy_KepListStuff.utils import tensor2pil, pil2tensor
+from custom_nodes.Comfy_KepListStuff.labels import get_font
+from custom_nodes.Comfy_KepListStuff.utils import UInt8Buffer, batch2uint8, pils2batch
 
 # Hack: string type that is always equal in not equal comparisons
 class AnyType(str):
@@ -63,7 +63,7 @@ class StackImages:
         batch_stack_direction = batch_stack_mode[0]
 
         if len(splits) == 1:
-            splits = splits * (int(len(images) / splits[0]))
+            splits = [splits[0]] * (int(len(images) / splits[0]))
             if sum(splits) != len(images):
                 splits.append(len(images) - sum(splits))
         else:
@@ -125,7 +125,7 @@ class StackImages:
 
         if has_horizontal_labels:
             assert horizontal_labels is not None
-            font = ImageFont.truetype(fm.findfont(fm.FontProperties()), 60)
+            font = get_font(60)
             for label_idx, label in enumerate(horizontal_labels):
                 x_offset = (batch_w * label_idx) + x_label_offset
                 draw = ImageDraw.Draw(full_image)
@@ -134,25 +134,26 @@ class StackImages:
 
         if has_vertical_labels:
             assert vertical_labels is not None
-            font = ImageFont.truetype(fm.findfont(fm.FontProperties()), 60)
+            font = get_font(60)
             for label_idx, label in enumerate(vertical_labels):
                 y_offset = (batch_h * label_idx) + y_label_offset
                 draw = ImageDraw.Draw(full_image)
                 draw.rectangle((0, y_offset, 60, y_offset + batch_h), fill="#ffffff")
                 draw.text((0, y_offset + (batch_h / 2)), label, fill="red", font=font)
 
+        # Every batch is converted into the same buffer and pasted as one strip before the next batch is converted
+        buffer = UInt8Buffer()
         for split_idx, split in enumerate(splits):
             for idx_in_split in range(split):
                 batch_img = Image.new("RGB", (batch_w, batch_h))
-                batch = batches[batch_idx + idx_in_split]
+                pixels = batch2uint8(batches[batch_idx + idx_in_split], buffer)
+                num, img_h, img_w, channels = pixels.shape
                 if batch_stack_direction == "horizontal":
-                    for img_idx, img in enumerate(batch):
-                        x_offset = image_w * img_idx
-                        batch_img.paste(tensor2pil(img), (x_offset, 0))
+                    strip = pixels.permute(1, 0, 2, 3).reshape(img_h, num * img_w, channels)
                 else:
-                    for img_idx, img in enumerate(batch):
-                        y_offset = image_h * img_idx
-                        batch_img.paste(tensor2pil(img), (0, y_offset))
+                    strip = pixels.reshape(num * img_h, img_w, channels)
+                strip_arr = strip.numpy()
+                batch_img.paste(Image.fromarray(strip_arr[..., 0] if channels == 1 else strip_arr), (0, 0))
 
                 if stack_direction == "horizontal":
                     x_offset = batch_w * split_idx + x_label_offset
@@ -163,4 +164,4 @@ class StackImages:
                 full_image.paste(batch_img, (x_offset, y_offset))
 
             batch_idx += split
-        return (pil2tensor(full_image),)
+        return (pils2batch([full_image]),)
@@ -1,21 +1,71 @@
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Tuple, Union, Optional, Callable, TYPE_CHECKING
+from typing import Any, Dict, List, Tuple, Union, Optional, Callable, Sequence, TYPE_CHECKING
 
 import torch
-from PIL import ImageFont, ImageDraw, Image
-import matplotlib.font_manager as fm
 from torch import Tensor
 
+from custom_nodes.Comfy_KepListStuff.compositor import (
+    CANVAS_DTYPES,
+    GridCell,
+    GridCompositor,
+    GridLayout,
+    LabelStrip,
+    PageState,
+)
+from custom_nodes.Comfy_KepListStuff.export import EXPORT_FORMATS, export_page
+from custom_nodes.Comfy_KepListStuff.labels import render_text_mask
+from custom_nodes.Comfy_KepListStuff.loader import (
+    DecodedImageCache,
+    LazyImageList,
+    default_cache_dir,
+    load_images,
+    pack_by_resolution,
+)
+from custom_nodes.Comfy_KepListStuff.sequences import ListHandle, unwrap
+from custom_nodes.Comfy_KepListStuff.sweep import PLACEHOLDER_INDEX, SweepCellStore
 from custom_nodes.Comfy_KepListStuff.utils import (
+    error_if_mismatched_list_args,
+    output_directory,
+    resize_batch,
+    uint82tensor,
     zip_with_fill,
-    tensor2pil,
-    pil2tensor,
 )
 if TYPE_CHECKING:
     from mypy.typeshed.stdlib._typeshed import SupportsDunderGT, SupportsDunderLT
 
 
+def _overlay_color(rgb: Tuple[int, int, int], channels: int, like: Tensor) -> Tensor:
+    if channels == 1:
+        # PIL's L conversion
+        values = [(rgb[0] * 299 + rgb[1] * 587 + rgb[2] * 114) / 1000]
+    else:
+        values = list(rgb) + [255] * (channels - 3)
+    return torch.tensor(values, dtype=like.dtype, device=like.device) / 255.0
+
+
+def _blend_mask(batch: Tensor, mask: Tensor, y: int, color: Tensor) -> None:
+    """
+    Alpha blends color onto every image of batch using the uint8 mask placed at (0, y)
+    """
+    mask_h, mask_w = min(mask.shape[0], batch.shape[1] - y), min(mask.shape[1], batch.shape[2])
+    if mask_h <= 0 or mask_w <= 0:
+        return
+    alpha = uint82tensor(mask[:mask_h, :mask_w]).to(device=batch.device, dtype=batch.dtype).unsqueeze(-1)
+    region = batch[:, y:y + mask_h, :mask_w]
+    region.sub_(color).mul_(1.0 - alpha).add_(color)
+
+
+def solid_batch(colors: Tensor, height: int, width: int) -> Tensor:
+    """
+    :param colors: Tensor [B, C], one color per batch index
+    :return: Tensor [B, H, W, C] where every image is a single color. Broadcast view, no pixels are allocated.
+    """
+    return colors[:, None, None, :].expand(-1, height, width, -1)
+
+
 class ImageLabelOverlay:
     def __init__(self) -> None:
         pass
@@ -67,30 +117,30 @@ class ImageLabelOverlay:
 
         image_h, _, _ = batches[0][0].size()
 
-        font = ImageFont.truetype(fm.findfont(fm.FontProperties()), 60)
-
-        ret_images: List[Tensor]= []
+        ret_images: List[Tensor] = []
         loop_gen = zip_with_fill(batches, float_labels, int_labels, str_labels)
         for b_idx, (img_batch, float_lbl, int_lbl, str_lbl) in enumerate(loop_gen):
-            batch: List[Tensor] = []
-            for i_idx, img in enumerate(img_batch):
-                pil_img = tensor2pil(img)
-                # print(f"Batch: {b_idx} | img: {i_idx}")
-                # print(img.size())
-                draw = ImageDraw.Draw(pil_img)
-
-                draw.text((0, image_h - 60), f"B: {b_idx} | I: {i_idx}", fill="red", font=font)
-
-                y_offset = 0
-                for _, lbl in zip(["float", "int", "str"], [float_lbl, int_lbl, str_lbl]):
-                    if lbl is None:
-                        continue
-                    draw.rectangle((0, 0 + y_offset, 512, 60 + y_offset), fill="#ffff33")
-                    draw.text((0, 0 + y_offset), str(lbl), fill="red", font=font)
-                    y_offset += 60
-                batch.append(pil2tensor(pil_img))
-
-            ret_images.append(torch.cat(batch))
+            batch = img_batch.clamp(0.0, 1.0)
+            _, batch_h, batch_w, channels = batch.shape
+            text_color = _overlay_color((255, 0, 0), channels, batch)
+
+            # Only the counter differs between images of a batch
+            counter_y = max(image_h - 60, 0)
+            for i_idx in range(len(batch)):
+                mask = render_text_mask(f"B: {b_idx} | I: {i_idx}", 60, batch_w, batch_h - counter_y)
+                _blend_mask(batch[i_idx:i_idx + 1], mask, counter_y, text_color)
+
+            y_offset = 0
+            for lbl in [float_lbl, int_lbl, str_lbl]:
+                if lbl is None:
+                    continue
+                # Matches PIL's inclusive rectangle of (0, y_offset, 512, 60 + y_offset)
+                batch[:, y_offset:61 + y_offset, :513] = _overlay_color((255, 255, 51), channels, batch)
+                mask = render_text_mask(str(lbl), 60, batch_w, max(batch_h - y_offset, 0))
+                _blend_mask(batch, mask, y_offset, text_color)
+                y_offset += 60
+
+            ret_images.append(batch)
 
         return (ret_images,)
 
@@ -106,7 +156,8 @@ ANY = AnyType("*")
 
 class XYImage:
     def __init__(self) -> None:
-        pass
+        # Last render of every page, kept for incremental mode
+        self.incremental_pages: List[PageState] = []
 
     @classmethod
     def INPUT_TYPES(s) -> Dict[str, Dict[str, Any]]:
@@ -125,24 +176,148 @@ class XYImage:
                 "x_labels": (ANY,{}),
                 "y_labels": (ANY,{}),
                 "z_labels": (ANY,{}),
+                "tile_mode": (["disabled", "tiles", "memmap"], {"default": "disabled"}),
+                "tile_size": ("INT", {"default": 2048, "min": 64, "max": 16384, "step": 64}),
+                "memmap_dir": ("STRING", {"default": ""}),
+                "checkpoint": ("STRING", {"forceInput": True}),
+                "indices": ("INT", {"forceInput": True}),
+                "incremental": (["False", "True"], {"default": "False"}),
+                "incremental_cache_mb": ("INT", {"default": 2048, "min": 0, "max": 65536}),
+                "precision": (s.PRECISIONS, {"default": "float32"}),
+                "cell_size": ("INT", {"default": 0, "min": 0, "max": 16384}),
+                "max_grid_size": ("INT", {"default": 0, "min": 0, "max": 65536}),
+                "render_workers": ("INT", {"default": 1, "min": 1, "max": 256}),
+                "export_format": (["disabled"] + list(EXPORT_FORMATS), {"default": "disabled"}),
+                "export_path": ("STRING", {"default": ""}),
+                "export_quality": ("INT", {"default": 95, "min": 1, "max": 100}),
+                "export_preview": ("INT", {"default": 512, "min": 0, "max": 4096}),
             }
         }
 
     RELOAD_INST = True
-    RETURN_TYPES = ("IMAGE",)
-    RETURN_NAMES = ("Image",)
+    RETURN_TYPES = ("IMAGE", "STRING", "INT", "INT")
+    RETURN_NAMES = ("Image", "Export Paths", "Tile Rows", "Tile Columns")
     INPUT_IS_LIST = (True,)
-    OUTPUT_IS_LIST = (True,)
+    OUTPUT_IS_LIST = (True, True, False, False)
     OUTPUT_NODE = True
     FUNCTION = "xy_image"
 
     CATEGORY = "List Stuff"
 
 
+    # Output grids are handed to IMAGE inputs, which expect floats in 0..1. Exports render into uint8 on their own.
+    PRECISIONS = ["float32", "float16"]
     MAIN_LABEL_SIZE = 60
     LABEL_SIZE = 60
     Z_LABEL_SIZE = 60
     LABEL_COLOR = "#000"
+
+    @staticmethod
+    def fill_from_checkpoint(images: List[Tensor], indices: Optional[List[int]], checkpoint: str) -> List[Tensor]:
+        """
+        Stores the newly rendered cells in the checkpoint and loads every cell of the sweep from it
+        :param images: Cells rendered in this run, only the placeholder if the sweep was already complete
+        :param indices: Flat product indices of images
+        :param checkpoint: Checkpoint directory from XYAny/N-D Product Any
+        :return: Cells of the whole sweep, cells that weren't rendered yet are black
+        """
+        if indices is None:
+            raise Exception("indices must be connected when checkpoint is set.")
+        if len(images) != len(indices):
+            raise Exception(f"Number of images must match number of indices. Got {len(images)} images for {len(indices)} indices.")
+
+        store = SweepCellStore(Path(checkpoint))
+        rendered = [(idx, img_batch) for idx, img_batch in zip(indices, images) if idx != PLACEHOLDER_INDEX]
+        for idx, img_batch in rendered:
+            store.put(idx, img_batch)
+        total = store.read_total()
+        if not store.missing(range(total)) or len(rendered) == 0:
+            return store.load_all(total)
+
+        # Sweeps limited by max_cells_per_run finish over several runs, until then the grid shows the progress
+        cells: List[Tensor] = []
+        for idx in range(total):
+            cell = store.get(idx)
+            cells.append(cell if cell is not None else torch.zeros_like(rendered[0][1]))
+        return cells
+
+    def render_incremental(
+            self,
+            compositor: GridCompositor,
+            pages: List[Sequence[Tensor]],
+            cache_mb: int,
+            workers: int,
+    ) -> List[Tensor]:
+        """
+        Renders every page, repainting only the cells and labels that changed since the last run of this node.
+        Pages are only kept for the next run if they fit in cache_mb.
+        """
+        previous = self.incremental_pages + [None] * (len(pages) - len(self.incremental_pages))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map keeps the page order
+            states = list(executor.map(compositor.render_page_incremental, pages, range(len(pages)), previous))
+
+        retained_bytes = sum(state.canvas.numel() * state.canvas.element_size() for state in states)
+        self.incremental_pages = states if retained_bytes <= cache_mb * 1024 * 1024 else []
+        return [state.canvas for state in states]
+
+    @staticmethod
+    def export_paths(export_path: str, export_format: str, num_z: int) -> List[Path]:
+        """
+        :param export_path: File to export to, Z pages get a _<page> suffix. Empty exports to the output directory.
+        :return: One path per page
+        """
+        if export_path == "":
+            base = output_directory() / f"xyimage_{time.time_ns()}"
+        else:
+            base = Path(export_path).with_suffix("")
+        base.parent.mkdir(parents=True, exist_ok=True)
+        extension = EXPORT_FORMATS[export_format]
+        if num_z == 1:
+            return [base.with_name(base.name + extension)]
+        return [base.with_name(f"{base.name}_{z_idx:03d}{extension}") for z_idx in range(num_z)]
+
+    @staticmethod
+    def scaled(size: int, scale: float) -> int:
+        return max(1, round(size * scale))
+
+    @classmethod
+    def grid_scale(
+            cls,
+            image_h: int,
+            image_w: int,
+            images_across: int,
+            images_down: int,
+            cols: int,
+            rows: int,
+            margins_w: List[int],
+            margins_h: List[int],
+            cell_size: int,
+            max_grid_size: int,
+    ) -> float:
+        """
+        Downscale factor for images and labels, never upscales
+        :param cell_size: Largest side of a single image after scaling, 0 to disable
+        :param max_grid_size: Largest side of the whole grid after scaling, 0 to disable
+        :return:
+        """
+        scale = 1.0
+        if cell_size > 0:
+            scale = min(scale, cell_size / max(image_h, image_w))
+        if max_grid_size > 0:
+            def grid_side(s: float) -> int:
+                return max(
+                    cls.scaled(image_w, s) * images_across * cols + sum(cls.scaled(m, s) for m in margins_w),
+                    cls.scaled(image_h, s) * images_down * rows + sum(cls.scaled(m, s) for m in margins_h),
+                )
+            scale = min(scale, max_grid_size / max(grid_side(1.0), 1))
+            # Rounding of the scaled sizes can overshoot by a few pixels
+            for _ in range(16):
+                if grid_side(scale) <= max_grid_size:
+                    break
+                scale *= max_grid_size / (grid_side(scale) + 1)
+        return scale
+
     def xy_image(
             self,
             images: List[Tensor],
@@ -156,7 +331,34 @@ class XYImage:
             x_labels: Optional[List[str]] = None,
             y_labels: Optional[List[str]] = None,
             z_labels: Optional[List[str]] = None,
-    ) -> Tuple[List[Tensor]]:
+            tile_mode: Optional[List[str]] = None,
+            tile_size: Optional[List[int]] = None,
+            memmap_dir: Optional[List[str]] = None,
+            checkpoint: Optional[List[str]] = None,
+            indices: Optional[List[int]] = None,
+            incremental: Optional[List[str]] = None,
+            incremental_cache_mb: Optional[List[int]] = None,
+            precision: Optional[List[str]] = None,
+            cell_size: Optional[List[int]] = None,
+            max_grid_size: Optional[List[int]] = None,
+            render_workers: Optional[List[int]] = None,
+            export_format: Optional[List[str]] = None,
+            export_path: Optional[List[str]] = None,
+            export_quality: Optional[List[int]] = None,
+            export_preview: Optional[List[int]] = None,
+    ) -> Tuple[List[Tensor], List[str], int, int]:
+        """
+        tile_mode "tiles" returns every page as Tile Rows x Tile Columns tiles of at most tile_size pixels, row by row,
+        and "memmap" returns every page as a whole. Both render into memmaps in memmap_dir (ComfyUI's temp
+        directory by default), so the grid doesn't have to fit in RAM.
+        precision selects the dtype of the output grid, float16 halves the memory. Exports always render in uint8.
+        With export_format set, every page is streamed to a file band by band (tile_size rows at a time)
+        instead of being returned, the Image output then only holds the previews.
+        """
+        if tile_mode is None:
+            tile_mode = ["disabled"]
+        if tile_size is None:
+            tile_size = [2048]
         if len(flip_axis) != 1:
             raise Exception("Only single flip_axis value supported.")
         if len(batch_stack_mode) != 1:
@@ -169,6 +371,63 @@ class XYImage:
             raise Exception("Only single y_main_label value supported.")
         if z_main_label is not None and len(z_main_label) != 1:
             raise Exception("Only single z_main_label value supported.")
+        if len(tile_mode) != 1:
+            raise Exception("Only single tile_mode value supported.")
+        if len(tile_size) != 1:
+            raise Exception("Only single tile_size value supported.")
+        if checkpoint is not None and len(checkpoint) != 1:
+            raise Exception("Only single checkpoint value supported.")
+        if incremental is None:
+            incremental = ["False"]
+        if incremental_cache_mb is None:
+            incremental_cache_mb = [2048]
+        if len(incremental) != 1:
+            raise Exception("Only single incremental value supported.")
+        if len(incremental_cache_mb) != 1:
+            raise Exception("Only single incremental_cache_mb value supported.")
+        if precision is None:
+            precision = ["float32"]
+        if len(precision) != 1:
+            raise Exception("Only single precision value supported.")
+        if precision[0] not in self.PRECISIONS:
+            raise ValueError(f"Unknown precision {precision[0]}, must be one of {', '.join(self.PRECISIONS)}")
+        if cell_size is None:
+            cell_size = [0]
+        if max_grid_size is None:
+            max_grid_size = [0]
+        if len(cell_size) != 1:
+            raise Exception("Only single cell_size value supported.")
+        if len(max_grid_size) != 1:
+            raise Exception("Only single max_grid_size value supported.")
+        if memmap_dir is None:
+            memmap_dir = [""]
+        if len(memmap_dir) != 1:
+            raise Exception("Only single memmap_dir value supported.")
+        if render_workers is None:
+            render_workers = [1]
+        if len(render_workers) != 1:
+            raise Exception("Only single render_workers value supported.")
+        if export_format is None:
+            export_format = ["disabled"]
+        if export_path is None:
+            export_path = [""]
+        if export_quality is None:
+            export_quality = [95]
+        if export_preview is None:
+            export_preview = [512]
+        if len(export_format) != 1:
+            raise Exception("Only single export_format value supported.")
+        if len(export_path) != 1:
+            raise Exception("Only single export_path value supported.")
+        if len(export_quality) != 1:
+            raise Exception("Only single export_quality value supported.")
+        if len(export_preview) != 1:
+            raise Exception("Only single export_preview value supported.")
+
+        # Lazy image lists arrive as a single handle, cells are then only decoded while their page is rendered
+        images = unwrap(images)
+        if checkpoint is not None and checkpoint[0] != "":
+            images = self.fill_from_checkpoint(images, indices, checkpoint[0])
 
         if x_main_label is not None and not isinstance(x_main_label[0], str):
             try:
@@ -202,7 +461,7 @@ class XYImage:
         batch_stack_direction = batch_stack_mode[0]
 
         if len(splits) == 1:
-            splits = splits * (int(len(images) / splits[0]))
+            splits = [splits[0]] * (int(len(images) / splits[0]))
             if sum(splits) != len(images):
                 splits.append(len(images) - sum(splits))
         else:
@@ -210,7 +469,9 @@ class XYImage:
                 raise Exception("Sum of splits must equal number of images.")
 
         batches = images
-        batch_size = len(batches[0])
+        # Read once, lazy image lists decode on every access
+        first_batch = batches[0]
+        batch_size = len(first_batch)
 
         # TODO: Some better way...
         # Currently chops splits to match x_labels/y_labels and then loops over the split set over and over
@@ -230,7 +491,35 @@ class XYImage:
             splits = splits[:splits_per_z]
             images_per_z = sum(splits)
 
-        image_h, image_w, _ = batches[0][0].size()
+        image_h, image_w, _ = first_batch[0].size()
+
+        # region Downscaling
+        if stack_direction == "horizontal":
+            cols, rows = len(splits), max(splits)
+        else:
+            cols, rows = max(splits), len(splits)
+        # Label strips left of and above the images
+        margins_w = [size for size, used in [(self.LABEL_SIZE, y_labels), (self.MAIN_LABEL_SIZE, y_main_label)] if used is not None]
+        margins_h = [
+            size for size, used in [(self.LABEL_SIZE, x_labels), (self.Z_LABEL_SIZE, z_labels), (self.MAIN_LABEL_SIZE, x_main_label)]
+            if used is not None
+        ]
+        scale = self.grid_scale(
+            image_h, image_w, batch_size if batch_stack_direction == "horizontal" else 1,
+            batch_size if batch_stack_direction == "vertical" else 1,
+            cols, rows, margins_w, margins_h, cell_size[0], max_grid_size[0],
+        )
+        label_size = self.scaled(self.LABEL_SIZE, scale)
+        main_label_size = self.scaled(self.MAIN_LABEL_SIZE, scale)
+        z_label_size = self.scaled(self.Z_LABEL_SIZE, scale)
+        if scale < 1.0:
+            # Batches are shrunk before compositing, so the canvas never exists at full size
+            batches = [
+                resize_batch(batch, self.scaled(batch.shape[1], scale), self.scaled(batch.shape[2], scale))
+                for batch in batches
+            ]
+            image_h, image_w = self.scaled(image_h, scale), self.scaled(image_w, scale)
+        # endregion
         if batch_stack_direction == "horizontal":
             batch_h = image_h
             # stack horizontally
@@ -259,8 +548,8 @@ class XYImage:
             else:
                 if len(x_labels) != max(splits):
                     raise Exception("Number of horizontal labels must match maximum split size.")
-            full_h += self.LABEL_SIZE
-            y_label_offset = self.LABEL_SIZE
+            full_h += label_size
+            y_label_offset = label_size
             has_horizontal_labels = True
 
         x_label_offset = 0
@@ -273,8 +562,8 @@ class XYImage:
             else:
                 if len(y_labels) != len(splits):
                     raise Exception(f"Number of vertical labels must match number of splits. Got {len(y_labels)} labels for {len(splits)} splits.")
-            full_w += self.LABEL_SIZE
-            x_label_offset = self.LABEL_SIZE
+            full_w += label_size
+            x_label_offset = label_size
             has_vertical_labels = True
 
         has_z_labels = False
@@ -283,103 +572,116 @@ class XYImage:
             z_labels = [str(lbl) for lbl in z_labels]
             if z_main_label is not None:
                 z_labels = [f"{z_main_label[0]}: {lbl}" for lbl in z_labels]
-            full_h += self.Z_LABEL_SIZE
-            y_label_offset += self.Z_LABEL_SIZE
+            full_h += z_label_size
+            y_label_offset += z_label_size
             if len(z_labels) != num_z:
                 raise Exception(f"Number of z_labels must match number of z splits. Got {len(z_labels)} labels for {num_z} splits.")
 
         has_main_x_label = False
         if x_main_label is not None:
-            full_h += self.MAIN_LABEL_SIZE
-            y_label_offset += self.MAIN_LABEL_SIZE
+            full_h += main_label_size
+            y_label_offset += main_label_size
             has_main_x_label = True
 
         has_main_y_label = False
         if y_main_label is not None:
-            full_w += self.MAIN_LABEL_SIZE
-            x_label_offset += self.MAIN_LABEL_SIZE
+            full_w += main_label_size
+            x_label_offset += main_label_size
             has_main_y_label = True
 
+        layout = GridLayout(full_w, full_h, image_h, image_w, batch_size, batch_stack_direction)
+
+        active_y_offset = 0
+        active_x_offset = 0
+        if has_z_labels:
+            assert z_labels is not None
+            layout.page_strips = [
+                [LabelStrip(label, 0, 0, full_w, z_label_size, z_label_size, x_label_offset + grid_w // 2)]
+                for label in z_labels
+            ]
+            active_y_offset += z_label_size
+
+        if has_main_x_label:
+            assert x_main_label is not None
+            layout.strips.append(LabelStrip(
+                x_main_label[0], 0, active_y_offset, full_w, main_label_size, main_label_size, x_label_offset + grid_w // 2
+            ))
+            active_y_offset += main_label_size
+
+        if has_horizontal_labels:
+            assert x_labels is not None
+            for label_idx, label in enumerate(x_labels):
+                x_offset = (batch_w * label_idx) + x_label_offset
+                layout.strips.append(LabelStrip(
+                    label, x_offset, active_y_offset, batch_w, label_size, label_size, batch_w / 2
+                ))
+
+        if has_main_y_label:
+            assert y_main_label is not None
+            strip_w = full_h - active_y_offset
+            layout.strips.append(LabelStrip(
+                y_main_label[0], active_x_offset, active_y_offset, strip_w, main_label_size, main_label_size, strip_w // 2, rotate=True
+            ))
+            active_x_offset += main_label_size
+
+        if has_vertical_labels:
+            assert y_labels is not None
+            for label_idx, label in enumerate(y_labels):
+                y_offset = (batch_h * label_idx) + y_label_offset
+                layout.strips.append(LabelStrip(
+                    label, active_x_offset, y_offset, batch_h, label_size, label_size, batch_h // 2, rotate=True
+                ))
+
+        batch_idx = 0
+        for split_idx, split in enumerate(splits):
+            for idx_in_split in range(split):
+                if stack_direction == "horizontal":
+                    x_offset = batch_w * split_idx + x_label_offset
+                    y_offset = batch_h * idx_in_split + y_label_offset
+                else:
+                    x_offset = batch_w * idx_in_split + x_label_offset
+                    y_offset = batch_h * split_idx + y_label_offset
+                layout.cells.append(GridCell(batch_idx + idx_in_split, x_offset, y_offset))
+            batch_idx += split
+
+        memmap_path = Path(memmap_dir[0]) if memmap_dir[0] != "" else None
+        compositor = GridCompositor(layout, self.LABEL_COLOR, CANVAS_DTYPES[precision[0]], memmap_path)
+        pages = [batches[images_per_z * z_idx:images_per_z * (z_idx + 1)] for z_idx in range(num_z)]
+        if export_format[0] != "disabled":
+            self.incremental_pages = []
+            export_compositor = GridCompositor(layout, self.LABEL_COLOR, torch.uint8, memmap_path)
+            paths = self.export_paths(export_path[0], export_format[0], num_z)
+            with ThreadPoolExecutor(max_workers=render_workers[0]) as executor:
+                previews = list(executor.map(
+                    lambda z_idx: export_page(
+                        export_compositor, pages[z_idx], z_idx, paths[z_idx], export_format[0], tile_size[0],
+                        export_quality[0], export_preview[0],
+                    ),
+                    range(num_z),
+                ))
+            return [preview for preview in previews if preview is not None], [str(path) for path in paths], 1, 1
+
+        if incremental[0] == "True" and tile_mode[0] == "disabled":
+            return self.render_incremental(compositor, pages, incremental_cache_mb[0], render_workers[0]), [], 1, 1
+        self.incremental_pages = []
+
+        if render_workers[0] > 1 and tile_mode[0] == "disabled":
+            with ThreadPoolExecutor(max_workers=render_workers[0]) as executor:
+                return compositor.render_pages(pages, executor, render_workers[0]), [], 1, 1
+
         images = []
-        for z_idx in range(num_z):
-            full_image = Image.new("RGB", (full_w, full_h))
-            full_draw = ImageDraw.Draw(full_image)
-
-            full_draw.rectangle((0, 0, full_w, full_h), fill="#ffffff")
-
-            batch_idx = 0
-            active_y_offset = 0
-            active_x_offset = 0
-            if has_z_labels:
-                font = ImageFont.truetype(fm.findfont(fm.FontProperties()), self.Z_LABEL_SIZE)
-                full_draw.rectangle((0, 0, full_w, self.Z_LABEL_SIZE), fill="#ffffff")
-                full_draw.text((grid_w//2 + x_label_offset, 0),  z_labels[z_idx], anchor='ma', fill=self.LABEL_COLOR, font=font)
-                active_y_offset += self.Z_LABEL_SIZE
-
-            if has_main_x_label:
-                assert x_main_label is not None
-                font = ImageFont.truetype(fm.findfont(fm.FontProperties()), self.MAIN_LABEL_SIZE)
-                full_draw.rectangle((0, active_y_offset, full_w, self.MAIN_LABEL_SIZE + active_y_offset), fill="#ffffff")
-                full_draw.text((grid_w//2 + x_label_offset, 0 + active_y_offset), x_main_label[0], anchor='ma', fill=self.LABEL_COLOR, font=font)
-                active_y_offset += self.MAIN_LABEL_SIZE
-
-            if has_horizontal_labels:
-                assert x_labels is not None
-                font = ImageFont.truetype(fm.findfont(fm.FontProperties()), self.LABEL_SIZE)
-                for label_idx, label in enumerate(x_labels):
-                    x_offset = (batch_w * label_idx) + x_label_offset
-                    full_draw.rectangle((x_offset, 0 + active_y_offset, x_offset + batch_w, self.LABEL_SIZE + active_y_offset), fill="#ffffff")
-                    full_draw.text((x_offset + (batch_w / 2), 0 + active_y_offset), label, anchor='ma', fill=self.LABEL_COLOR, font=font)
-
-            if has_main_y_label:
-                assert y_main_label is not None
-                font = ImageFont.truetype(fm.findfont(fm.FontProperties()), self.MAIN_LABEL_SIZE)
-
-                img_txt = Image.new('RGB', (full_h - active_y_offset, self.MAIN_LABEL_SIZE))
-                draw_txt = ImageDraw.Draw(img_txt)
-                draw_txt.rectangle((0, 0, full_h - active_y_offset, self.MAIN_LABEL_SIZE), fill="#ffffff")
-                draw_txt.text(((full_h - active_y_offset)//2, 0),  y_main_label[0], anchor='ma', fill=self.LABEL_COLOR, font=font)
-                img_txt = img_txt.rotate(90, expand=True)
-                full_image.paste(img_txt, (active_x_offset, active_y_offset))
-                active_x_offset += self.MAIN_LABEL_SIZE
-
-            if has_vertical_labels:
-                assert y_labels is not None
-                font = ImageFont.truetype(fm.findfont(fm.FontProperties()), self.LABEL_SIZE)
-                for label_idx, label in enumerate(y_labels):
-                    y_offset = (batch_h * label_idx) + y_label_offset
-
-                    img_txt = Image.new('RGB', (batch_h, self.LABEL_SIZE))
-                    draw_txt = ImageDraw.Draw(img_txt)
-                    draw_txt.rectangle((0, 0, batch_h, self.LABEL_SIZE), fill="#ffffff")
-                    draw_txt.text((batch_h//2, 0),  label, anchor='ma', fill=self.LABEL_COLOR, font=font)
-                    img_txt = img_txt.rotate(90, expand=True)
-                    full_image.paste(img_txt, (active_x_offset, y_offset))
-
-            for split_idx, split in enumerate(splits):
-                for idx_in_split in range(split):
-                    batch_img = Image.new("RGB", (batch_w, batch_h))
-                    batch = batches[batch_idx + idx_in_split + images_per_z * z_idx]
-                    if batch_stack_direction == "horizontal":
-                        for img_idx, img in enumerate(batch):
-                            x_offset = image_w * img_idx
-                            batch_img.paste(tensor2pil(img), (x_offset, 0))
-                    else:
-                        for img_idx, img in enumerate(batch):
-                            y_offset = image_h * img_idx
-                            batch_img.paste(tensor2pil(img), (0, y_offset))
-
-                    if stack_direction == "horizontal":
-                        x_offset = batch_w * split_idx + x_label_offset
-                        y_offset = batch_h * idx_in_split + y_label_offset
-                    else:
-                        x_offset = batch_w * idx_in_split + x_label_offset
-                        y_offset = batch_h * split_idx + y_label_offset
-                    full_image.paste(batch_img, (x_offset, y_offset))
-
-                batch_idx += split
-            images.append(pil2tensor(full_image))
-        return (images,)
+        tile_rows, tile_columns = 1, 1
+        if tile_mode[0] == "tiles":
+            tile_rows, tile_columns = compositor.tile_grid(tile_size[0])
+        for z_idx, page_batches in enumerate(pages):
+            if tile_mode[0] == "tiles":
+                # Tiles of every page are returned row by row, one IMAGE per tile
+                images.extend(compositor.render_tiles(page_batches, z_idx, tile_size[0]))
+            elif tile_mode[0] == "memmap":
+                images.append(compositor.render_page_memmap(page_batches, z_idx, tile_size[0]))
+            else:
+                images.append(compositor.render_page(page_batches, z_idx))
+        return images, [], tile_rows, tile_columns
 
 class VariableImageBuilder:
     def __init__(self) -> None:
@@ -397,11 +699,15 @@ class VariableImageBuilder:
                 "height": ("INT", {"defaultInput": False, "default": 512}),
                 "batch_size": ("INT", {"default": 1, "min": 1}),
             },
+            "optional": {
+                "mode": (["RGB", "RGBA"], {"default": "RGB"}),
+            },
         }
 
     RELOAD_INST = True
     RETURN_TYPES = ("IMAGE",)
     RETURN_NAMES = ("Image",)
+    INPUT_IS_LIST = True
     OUTPUT_IS_LIST = (False,)
     FUNCTION = "generate_images"
 
@@ -409,19 +715,36 @@ class VariableImageBuilder:
 
     def generate_images(
             self,
-            r: int,
-            g: int,
-            b: int,
-            a: int,
-            width: int,
-            height: int,
-            batch_size: int,
+            r: List[int],
+            g: List[int],
+            b: List[int],
+            a: List[int],
+            width: List[int],
+            height: List[int],
+            batch_size: List[int],
+            mode: Optional[List[str]] = None,
     ) -> Tuple[Tensor]:
-        batch_tensors: List[Tensor] = []
-        for _ in range(batch_size):
-            image = Image.new("RGB", (width, height), color=(r, g, b, a))
-            batch_tensors.append(pil2tensor(image))
-        return (torch.cat(batch_tensors),)
+        """
+        One solid color per r/g/b/a index (single values are repeated), batch_size images per color,
+        all in a single batch. Alpha is only output in RGBA mode.
+        :return: Tensor [len(colors) * batch_size, H, W, 3 or 4], a broadcast view of the colors
+        """
+        if mode is None:
+            mode = ["RGB"]
+        if len(width) != 1:
+            raise Exception("Only single width supported.")
+        if len(height) != 1:
+            raise Exception("Only single height supported.")
+        if len(batch_size) != 1:
+            raise Exception("Only single batch size supported.")
+        if len(mode) != 1:
+            raise Exception("Only single mode supported.")
+        error_if_mismatched_list_args({"r": r, "g": g, "b": b, "a": a})
+
+        channels = 4 if mode[0] == "RGBA" else 3
+        colors = torch.tensor([color[:channels] for color in zip_with_fill(r, g, b, a)], dtype=torch.float32)
+        colors = colors.div_(255.0).repeat_interleave(batch_size[0], dim=0)
+        return (solid_batch(colors, height[0], width[0]),)
 
 
 class EmptyImages:
@@ -436,6 +759,8 @@ class EmptyImages:
                 "num_images": ("INT", {"forceInput": True, "min": 1}),
                 "splits": ("INT", {"forceInput": True, "min": 1}),
                 "batch_size": ("INT", {"default": 1, "min": 1}),
+                "width": ("INT", {"default": 512, "min": 1, "max": 16384}),
+                "height": ("INT", {"default": 512, "min": 1, "max": 16384}),
             }
         }
 
@@ -454,12 +779,22 @@ class EmptyImages:
             num_images: Optional[List[int]] = None,
             splits: Optional[List[int]] = None,
             batch_size: Optional[List[int]] = None,
+            width: Optional[List[int]] = None,
+            height: Optional[List[int]] = None,
     ) -> Tuple[List[Tensor]]:
         if batch_size is None:
             batch_size = [1]
         else:
             if len(batch_size) != 1:
                 raise Exception("Only single batch size supported.")
+        if width is None:
+            width = [512]
+        if height is None:
+            height = [512]
+        if len(width) != 1:
+            raise Exception("Only single width supported.")
+        if len(height) != 1:
+            raise Exception("Only single height supported.")
 
         if num_images is None and splits is None:
             raise Exception("Must provide either num_images or splits.")
@@ -489,6 +824,7 @@ class EmptyImages:
         if splits is None:
             raise ValueError("Unexpected error: Splits is None")
 
+        ramps: Dict[Tuple[int, int, int], Tensor] = {}
         ret_images: List[Tensor] = []
         for split_idx, split in enumerate(splits):
             # Rotate between fully dynamic range of colors
@@ -497,22 +833,32 @@ class EmptyImages:
                 30 + (split_idx * 75) % 200,
                 10 + (split_idx * 105) % 200,
             )
-            print(f"Splits: {split} | Base Color: {base_color}")
-
-            for _ in range(split):
-                batch_tensor = torch.zeros(batch_size[0], 512, 512, 3)
-                for batch_idx in range(batch_size[0]):
-                    batch_color = (
-                        (base_color[0] + int(((255 - base_color[0]) / batch_size[0]) * batch_idx)),
-                        (base_color[1] + int(((255 - base_color[1]) / batch_size[0]) * batch_idx)),
-                        (base_color[2] + int(((255 - base_color[2]) / batch_size[0]) * batch_idx)),
-                    )
-                    image = Image.new("RGB", (512, 512), color=batch_color)
-                    batch_tensor[batch_idx] = pil2tensor(image)
-                ret_images.append(batch_tensor)
+            if base_color not in ramps:
+                ramps[base_color] = self.color_ramp(base_color, batch_size[0], height[0], width[0])
+            # Every image of a split is the same view, nothing is allocated per image
+            ret_images.extend([ramps[base_color]] * split)
         return (ret_images,)
 
+    @staticmethod
+    def color_ramp(base_color: Tuple[int, int, int], batch_size: int, height: int, width: int) -> Tensor:
+        """
+        Batch ramping from base_color towards white, one solid color per batch index
+        :return: Tensor [B, H, W, 3], a broadcast view of a [B, 1, 1, 3] tensor
+        """
+        base = torch.tensor(base_color, dtype=torch.float64)
+        steps = torch.arange(batch_size, dtype=torch.float64)[:, None]
+        colors = base + (((255 - base) / batch_size) * steps).trunc()
+        return solid_batch(colors.to(torch.float32) / 255.0, height, width)
+
+
 class ImageListLoader:
+    """
+    With lazy_load, the images come out of Lazy Images as one handle and Images is empty, since ComfyUI would
+    decode every file copying a list output. Lazy Images only connects to inputs of any type: List Length,
+    Reverse List, Repeat List and Join List Any keep the handle lazy, and Materialize List turns it into a regular
+    image list. Their outputs connect to IMAGE inputs, XYImage then decodes one page at a time. Join Image Lists
+    only takes IMAGE inputs, use Join List Any to join lazy images.
+    """
     def __init__(self) -> None:
         pass
 
@@ -524,13 +870,22 @@ class ImageListLoader:
                 "file_filter": ("STRING", {"default": "*.png"}),
                 "sort_method": (["numerical", "alphabetical"], {"default": "numerical"}),
             },
+            "optional": {
+                "decode_workers": ("INT", {"default": 4, "min": 1, "max": 64}),
+                "worker_type": (["thread", "process"], {"default": "thread"}),
+                "decode_cache": (["bypass", "enabled"], {"default": "bypass"}),
+                "cache_size_mb": ("INT", {"default": 4096, "min": 1, "max": 1048576}),
+                "lazy_load": (["False", "True"], {"default": "False"}),
+                "prefetch": ("INT", {"default": 4, "min": 0, "max": 64}),
+                "pack_batch_size": ("INT", {"default": 1, "min": 1, "max": 4096}),
+            },
         }
 
     RELOAD_INST = True
-    RETURN_TYPES = ("IMAGE",)
-    RETURN_NAMES = ("Images",)
+    RETURN_TYPES = ("IMAGE", "INT", "LAZY_IMAGES")
+    RETURN_NAMES = ("Images", "Indices", "Lazy Images")
     INPUT_IS_LIST = False
-    OUTPUT_IS_LIST = (True,)
+    OUTPUT_IS_LIST = (True, True, False)
     FUNCTION = "load_images"
 
     CATEGORY = "List Stuff"
@@ -548,8 +903,18 @@ class ImageListLoader:
         return str(file_name)
 
     def load_images(
-        self, folder_path: str, file_filter: str, sort_method: str
-    ) -> Tuple[List[Tensor]]:
+        self,
+        folder_path: str,
+        file_filter: str,
+        sort_method: str,
+        decode_workers: int = 4,
+        worker_type: str = "thread",
+        decode_cache: str = "bypass",
+        cache_size_mb: int = 4096,
+        lazy_load: str = "False",
+        prefetch: int = 4,
+        pack_batch_size: int = 1,
+    ) -> Tuple[Sequence[Tensor], Sequence[int], ListHandle]:
         folder = Path(folder_path)
     
         if not folder.is_dir():
@@ -564,6 +929,20 @@ class ImageListLoader:
             raise ValueError(f"Unknown sort method {sort_method}")
 
         files = sorted(folder.glob(file_filter), key=sort_method_impl)
-        images = [pil2tensor(Image.open(file)) for file in files]
-    
-        return (images,)
+        cache = None
+        if decode_cache == "enabled":
+            cache = DecodedImageCache(default_cache_dir(), cache_size_mb * 1024 * 1024)
+
+        if lazy_load == "True":
+            if pack_batch_size > 1:
+                raise Exception("lazy_load does not support pack_batch_size > 1.")
+            if cache is not None:
+                cache.evict()
+            return [], list(range(len(files))), ListHandle(LazyImageList(files, cache, prefetch))
+
+        images = load_images(files, decode_workers, worker_type, cache)
+        if pack_batch_size > 1:
+            batches, indices = pack_by_resolution(images, pack_batch_size)
+            return batches, indices, ListHandle(batches)
+
+        return images, list(range(len(images))), ListHandle(images)
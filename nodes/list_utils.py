@@ -1,7 +1,8 @@
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Sequence, Tuple
 
 from torch import Tensor
 
+from custom_nodes.Comfy_KepListStuff.sequences import concat, materialize, repeat, reverse, unwrap, wrap_like
 from custom_nodes.Comfy_KepListStuff.utils import AnyType
 
 any_type = AnyType("*")
@@ -26,7 +27,7 @@ class ListLengthNode:
     CATEGORY = "List Stuff"
 
     def get_len(self, In: List[Any]) -> Tuple[int]:
-        return (len(In),)
+        return (len(unwrap(In)),)
 
 class RepeatList:
     def __init__(self) -> None:
@@ -49,10 +50,10 @@ class RepeatList:
 
     CATEGORY = "List Stuff"
 
-    def repeat_list(self, In: List[Any], Count: List[int]) -> Tuple[List[Any]]:
+    def repeat_list(self, In: Sequence[Any], Count: List[int]) -> Tuple[Sequence[Any]]:
         if len(Count) != 1:
             raise ValueError("Count does not support multiple values")
-        return (In * Count[0],)
+        return (wrap_like([In], repeat(unwrap(In), Count[0])),)
 
 class JoinListAny:
     def __init__(self) -> None:
@@ -85,18 +86,12 @@ class JoinListAny:
             self,
             *args: List[Tensor],
             **kwargs: List[Tensor],
-    ) -> Tuple[List[Tensor], List[int]]:
-        sizes = []
-        joined = []
-        for arg in args:
-            sizes.append(len(arg))
-            joined.extend(arg)
-        for arg in kwargs.values():
-            if arg is not None:
-                sizes.append(len(arg))
-                joined.extend(arg)
+    ) -> Tuple[Sequence[Tensor], List[int]]:
+        inputs = list(args) + [arg for arg in kwargs.values() if arg is not None]
+        parts = [unwrap(arg) for arg in inputs]
+        sizes = [len(part) for part in parts]
 
-        return joined, sizes
+        return wrap_like(inputs, concat(parts)), sizes
 
 class ReverseList:
     def __init__(self) -> None:
@@ -116,8 +111,29 @@ class ReverseList:
 
     CATEGORY = "List Stuff"
 
-    def reverse_list(self, In: List[Any]) -> Tuple[List[Any]]:
-        return (In[::-1],)
+    def reverse_list(self, In: Sequence[Any]) -> Tuple[Sequence[Any]]:
+        return (wrap_like([In], reverse(unwrap(In))),)
+
+class MaterializeList:
+    def __init__(self) -> None:
+        pass
+
+    @classmethod
+    def INPUT_TYPES(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            "required": {"In": (any_type, {})},
+        }
+
+    RETURN_TYPES = (any_type,)
+    RETURN_NAMES = ("List",)
+    INPUT_IS_LIST = True
+    OUTPUT_IS_LIST = (True,)
+    FUNCTION = "materialize_list"
+
+    CATEGORY = "List Stuff"
+
+    def materialize_list(self, In: Sequence[Any]) -> Tuple[List[Any]]:
+        return (materialize(unwrap(In)),)
 
 class JoinFloatLists:
     def __init__(self) -> None:
@@ -173,18 +189,12 @@ class JoinImageLists:
         self,
         *args: List[Tensor],
         **kwargs: List[Tensor],
-    ) -> Tuple[List[Tensor], List[int]]:
-        sizes = []
-        joined = []
-        for arg in args:
-            sizes.append(len(arg))
-            joined.extend(arg)
-        for arg in kwargs.values():
-            if arg is not None:
-                sizes.append(len(arg))
-                joined.extend(arg)
+    ) -> Tuple[Sequence[Tensor], List[int]]:
+        inputs = list(args) + [arg for arg in kwargs.values() if arg is not None]
+        parts = [unwrap(arg) for arg in inputs]
+        sizes = [len(part) for part in parts]
 
-        return joined, sizes
+        return wrap_like(inputs, concat(parts)), sizes
 
 
 class StringList:
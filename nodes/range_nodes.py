@@ -1,13 +1,16 @@
-from _decimal import Context, getcontext
+from _decimal import Context
 from decimal import Decimal
-from typing import Iterator, List, Tuple, Dict, Any, Union, Optional
-
-import numpy as np
-
-from custom_nodes.Comfy_KepListStuff.utils import (
-    error_if_mismatched_list_args,
-    zip_with_fill,
+from typing import List, Tuple, Dict, Any, Union
+
+from custom_nodes.Comfy_KepListStuff.range_engine import (
+    expand_segments,
+    float_num_steps_segments,
+    float_step_segments,
+    int_num_steps_values,
+    int_step_segments,
+    segment_sizes,
 )
+from custom_nodes.Comfy_KepListStuff.utils import error_if_mismatched_list_args
 
 custom_context = Context(prec=8)
 
@@ -40,18 +43,8 @@ class IntRangeNode:
     ) -> Tuple[List[int], List[int]]:
         error_if_mismatched_list_args(locals())
 
-        ranges = []
-        range_sizes = []
-        for e_start, e_stop, e_step, e_end_mode in zip_with_fill(
-            start, stop, step, end_mode
-        ):
-            if e_end_mode == "Inclusive":
-                e_stop += 1
-            vals = list(range(e_start, e_stop, e_step))
-            ranges.extend(vals)
-            range_sizes.append(len(vals))
-
-        return ranges, range_sizes
+        segments = int_step_segments(start, stop, step, end_mode)
+        return expand_segments(segments, as_float=False), segment_sizes(segments)
 
 
 class IntNumStepsRangeNode:
@@ -94,29 +87,7 @@ class IntNumStepsRangeNode:
 
         error_if_mismatched_list_args(locals())
 
-        ranges = []
-        range_sizes = []
-        for e_start, e_stop, e_num_steps, e_end_mode in zip_with_fill(
-            start, stop, num_steps, end_mode
-        ):
-            direction = 1 if e_stop > e_start else -1
-            if e_end_mode == "Exclusive":
-                e_stop -= direction
-
-            # Check for uneven steps
-            step_size = (e_stop - e_start) / (e_num_steps - 1)
-            if not allow_uneven_steps[0] == "True" and step_size != int(step_size):
-                raise ValueError(
-                    f"Uneven steps detected for start={e_start}, stop={e_stop}, num_steps={e_num_steps}."
-                )
-
-            vals = (
-                np.rint(np.linspace(e_start, e_stop, e_num_steps)).astype(int).tolist()
-            )
-            ranges.extend(vals)
-            range_sizes.append(len(vals))
-
-        return ranges, range_sizes
+        return int_num_steps_values(start, stop, num_steps, end_mode, allow_uneven_steps[0] == "True")
 
 
 class FloatRangeNode:
@@ -145,22 +116,6 @@ class FloatRangeNode:
 
     CATEGORY = "List Stuff"
 
-    @staticmethod
-    def _decimal_range(
-        start: Decimal, stop: Decimal, step: Decimal, inclusive: bool
-    ) -> Iterator[float]:
-        ret_val = start
-        if inclusive:
-            stop = stop + step
-
-        direction = 1 if step > 0 else -1
-        # while ret_val < stop:
-        #     yield float(ret_val)
-        #     ret_val += step
-        while (ret_val - stop) * direction < 0:
-            yield float(ret_val)
-            ret_val += step
-
     def build_range(
         self,
         start: List[Union[float, Decimal]],
@@ -169,24 +124,9 @@ class FloatRangeNode:
         end_mode: List[str],
     ) -> Tuple[List[float], List[int]]:
         error_if_mismatched_list_args(locals())
-        getcontext().prec = 12
-
-        start = [Decimal(s) for s in start]
-        stop = [Decimal(s) for s in stop]
-        step = [Decimal(s) for s in step]
-
-        ranges = []
-        range_sizes = []
-        for e_start, e_stop, e_step, e_end_mode in zip_with_fill(
-            start, stop, step, end_mode
-        ):
-            vals = list(
-                self._decimal_range(e_start, e_stop, e_step, e_end_mode == "Inclusive")
-            )
-            ranges.extend(vals)
-            range_sizes.append(len(vals))
 
-        return ranges, range_sizes
+        segments = float_step_segments(start, stop, step, end_mode)
+        return expand_segments(segments, as_float=True), segment_sizes(segments)
 
 
 class FloatNumStepsRangeNode:
@@ -214,22 +154,6 @@ class FloatNumStepsRangeNode:
 
     CATEGORY = "List Stuff"
 
-    @staticmethod
-    def _decimal_range(
-        start: Decimal, stop: Decimal, num_steps: int
-    ) -> Iterator[float]:
-        step = (stop - start) / (num_steps - 1)
-        direction = 1 if step > 0 else -1
-
-        ret_val = start
-        for _ in range(num_steps):
-            if (
-                ret_val - stop
-            ) * direction > 0:  # Ensure we don't exceed the 'stop' value
-                break
-            yield float(ret_val)
-            ret_val += step
-
     def build_range(
         self,
         start: List[Union[float, Decimal]],
@@ -237,16 +161,6 @@ class FloatNumStepsRangeNode:
         num_steps: List[int],
     ) -> Tuple[List[float], List[int]]:
         error_if_mismatched_list_args(locals())
-        getcontext().prec = 12
-
-        start = [Decimal(s) for s in start]
-        stop = [Decimal(s) for s in stop]
-
-        ranges = []
-        range_sizes = []
-        for e_start, e_stop, e_num_steps in zip_with_fill(start, stop, num_steps):
-            vals = list(self._decimal_range(e_start, e_stop, e_num_steps))
-            ranges.extend(vals)
-            range_sizes.append(len(vals))
 
-        return ranges, range_sizes
+        segments = float_num_steps_segments(start, stop, num_steps)
+        return expand_segments(segments, as_float=True), segment_sizes(segments)
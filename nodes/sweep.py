@@ -0,0 +1,97 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from torch import Tensor
+
+from custom_nodes.Comfy_KepListStuff.nodes.images import XYImage
+from custom_nodes.Comfy_KepListStuff.sweep import PLACEHOLDER_INDEX, SweepCellStore
+
+
+class SaveSweepCells:
+    """
+    Saves the images of a (sharded) sweep to a directory, keyed by their flat product index.
+    Connect Indices from XYAny/N-D Product Any so every worker writes its own cells.
+    """
+    def __init__(self) -> None:
+        pass
+
+    @classmethod
+    def INPUT_TYPES(s) -> Dict[str, Dict[str, Any]]:
+        return {
+            "required": {
+                "images": ("IMAGE",),
+                "indices": ("INT", {"forceInput": True}),
+                "directory": ("STRING", {"default": ""}),
+            },
+        }
+
+    RETURN_TYPES = ("INT",)
+    RETURN_NAMES = ("Saved Cells",)
+    INPUT_IS_LIST = True
+    OUTPUT_NODE = True
+    FUNCTION = "save_cells"
+
+    CATEGORY = "List Stuff"
+
+    def save_cells(self, images: List[Tensor], indices: List[int], directory: List[str]) -> Tuple[int]:
+        if len(directory) != 1:
+            raise Exception("Only single directory value supported.")
+        if directory[0] == "":
+            raise Exception("directory must be set.")
+        if len(images) != len(indices):
+            raise Exception(f"Number of images must match number of indices. Got {len(images)} images for {len(indices)} indices.")
+
+        store = SweepCellStore(Path(directory[0]))
+        saved = 0
+        for idx, img_batch in zip(indices, images):
+            if idx == PLACEHOLDER_INDEX:
+                continue
+            store.put(idx, img_batch)
+            saved += 1
+        return (saved,)
+
+
+class AssembleSweepGrid:
+    """
+    Loads every cell saved by SaveSweepCells from a directory and composes them like XYImage.
+    """
+    def __init__(self) -> None:
+        pass
+
+    @classmethod
+    def INPUT_TYPES(s) -> Dict[str, Dict[str, Any]]:
+        xy_inputs = XYImage.INPUT_TYPES()
+        required = {
+            "directory": ("STRING", {"default": ""}),
+            "total_images": ("INT", {"default": 1, "min": 1, "max": 1000000}),
+            **{name: value for name, value in xy_inputs["required"].items() if name != "images"},
+        }
+        # The assembling graph usually has no upstream sampler, so splits can be typed in as well
+        required["splits"] = ("INT", {"default": 1, "min": 1, "max": 1000000})
+        return {
+            "required": required,
+            "optional": xy_inputs["optional"],
+        }
+
+    RETURN_TYPES = XYImage.RETURN_TYPES
+    RETURN_NAMES = XYImage.RETURN_NAMES
+    INPUT_IS_LIST = True
+    OUTPUT_IS_LIST = XYImage.OUTPUT_IS_LIST
+    OUTPUT_NODE = True
+    FUNCTION = "assemble"
+
+    CATEGORY = "List Stuff"
+
+    def assemble(
+            self,
+            directory: List[str],
+            total_images: List[int],
+            **xy_image_args: Optional[List[Any]],
+    ) -> Tuple[List[Tensor], List[str], int, int]:
+        if len(directory) != 1:
+            raise Exception("Only single directory value supported.")
+        if len(total_images) != 1:
+            raise Exception("Only single total_images value supported.")
+
+        cells = SweepCellStore(Path(directory[0])).load_all(total_images[0])
+        return XYImage().xy_image(images=cells, **xy_image_args)  # type: ignore[arg-type]
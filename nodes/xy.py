@@ -1,5 +1,8 @@
 import itertools
-from typing import List, Any, Optional, Callable, Tuple, Dict
+from pathlib import Path
+from typing import List, Any, Optional, Sequence, Tuple, Dict
+
+from custom_nodes.Comfy_KepListStuff.sweep import PLACEHOLDER_INDEX, SweepCellStore, shard_range, sweep_key
 
 
 class AnyType(str):
@@ -10,6 +13,87 @@ class AnyType(str):
 # Our any instance wants to be a wildcard string
 ANY = AnyType("*")
 
+LABEL_FALLBACKS = ["str()", "Numbers"]
+MAX_AXES = 6
+
+
+def fallback_labels(values: Sequence[Any], mode: str) -> List[str]:
+    """
+    :param values: Axis values
+    :param mode: "str()" labels every value with str(value), "Numbers" with its index
+    :return:
+    """
+    if mode == "str()":
+        return [str(i) for i in values]
+    return [str(i) for i in range(len(values))]
+
+
+def single_shard_args(shard_index: Optional[List[int]], shard_count: Optional[List[int]]) -> Tuple[int, int]:
+    if shard_index is not None and len(shard_index) != 1:
+        raise Exception("Only single shard_index value supported.")
+    if shard_count is not None and len(shard_count) != 1:
+        raise Exception("Only single shard_count value supported.")
+    return (shard_index or [0])[0], (shard_count or [1])[0]
+
+
+def open_checkpoint(
+        checkpoint_dir: Optional[List[str]], axes: List[Sequence[Any]], labels: List[Optional[List[str]]], total: int
+) -> Optional[SweepCellStore]:
+    """
+    :param checkpoint_dir: Base directory of all checkpoints, empty/None disables checkpointing
+    :param labels: Connected labels of every axis, None for axes without, see sweep_key
+    :return: Cell store of this exact sweep, or None
+    """
+    if checkpoint_dir is not None and len(checkpoint_dir) != 1:
+        raise Exception("Only single checkpoint_dir value supported.")
+    if checkpoint_dir is None or checkpoint_dir[0] == "":
+        return None
+    store = SweepCellStore(Path(checkpoint_dir[0]) / sweep_key(axes, labels))
+    store.write_manifest(total, [len(values) for values in axes])
+    return store
+
+
+def single_max_cells(max_cells_per_run: Optional[List[int]]) -> int:
+    if max_cells_per_run is not None and len(max_cells_per_run) != 1:
+        raise Exception("Only single max_cells_per_run value supported.")
+    return (max_cells_per_run or [0])[0]
+
+
+def sweep_indices(
+        total: int, shard_index: int, shard_count: int, store: Optional[SweepCellStore], max_cells: int = 0
+) -> Sequence[int]:
+    """
+    :param max_cells: With a checkpoint, only the first max_cells missing cells are emitted, 0 emits all of them
+    :return: Flat indices of this shard that still have to be rendered, [PLACEHOLDER_INDEX] if there are none
+    """
+    indices: Sequence[int] = shard_range(total, shard_index, shard_count)
+    if store is not None:
+        completed = store.indices()
+        missing = [idx for idx in indices if idx not in completed]
+        # Every cell is saved as soon as the run that rendered it finishes,
+        # so limiting the cells per run bounds the work an interruption can lose
+        indices = missing[:max_cells] if max_cells > 0 else missing
+    if len(indices) == 0 and total > 0:
+        return [PLACEHOLDER_INDEX]
+    return indices
+
+
+def axis_values(values: Sequence[Any], stride: int, indices: Sequence[int]) -> List[Any]:
+    """
+    :param values: Values of one axis of the product
+    :param stride: Number of flat indices each value is repeated for in a row
+    :param indices: Flat indices to emit
+    :return: Value of the axis at every index
+    """
+    if len(indices) == 0:
+        return []
+    if isinstance(indices, range) and indices.step == 1:
+        # One cycle of the axis, cycled over the indices in C instead of computed per index
+        period = list(itertools.chain.from_iterable(itertools.repeat(value, stride) for value in values))
+        start = indices.start % len(period)
+        return list(itertools.islice(itertools.cycle(period), start, start + len(indices)))
+    return [values[(idx // stride) % len(values)] for idx in indices]
+
 
 class UnzippedProductAny:
     def __init__(self) -> None:
@@ -30,6 +114,10 @@ class UnzippedProductAny:
                 "X_Labels": (ANY, {}),
                 "Y_Labels": (ANY, {}),
                 "Z_Labels": (ANY, {}),
+                "shard_index": ("INT", {"default": 0, "min": 0, "max": 4096}),
+                "shard_count": ("INT", {"default": 1, "min": 1, "max": 4096}),
+                "checkpoint_dir": ("STRING", {"default": ""}),
+                "max_cells_per_run": ("INT", {"default": 0, "min": 0, "max": 1000000}),
             },
         }
 
@@ -42,9 +130,11 @@ class UnzippedProductAny:
         "Z Labels": "STRING",
         "Total Images": "INT",
         "Split Every": "INT",
+        "Indices": "INT",
+        "Checkpoint": "STRING",
     }.items())
 
-    OUTPUT_IS_LIST = (True, True, True, True, True, True, False, False)
+    OUTPUT_IS_LIST = (True, True, True, True, True, True, False, False, True, False)
     INPUT_IS_LIST = True
     FUNCTION = "to_xy"
 
@@ -61,7 +151,11 @@ class UnzippedProductAny:
         X_Labels: Optional[List[Any]] = None,
         Y_Labels: Optional[List[Any]] = None,
         Z_Labels: Optional[List[Any]] = None,
-    ) -> Tuple[List[Any], List[str], List[Any], List[str], List[Any], List[str], int, int]:
+        shard_index: Optional[List[int]] = None,
+        shard_count: Optional[List[int]] = None,
+        checkpoint_dir: Optional[List[str]] = None,
+        max_cells_per_run: Optional[List[int]] = None,
+    ) -> Tuple[Sequence[Any], List[str], Sequence[Any], List[str], Sequence[Any], List[str], int, int, Sequence[int], str]:
         # region Validation
         if len(X_Label_Fallback) != 1:
             raise Exception("X_Label_Fallback must be a single value")
@@ -73,48 +167,160 @@ class UnzippedProductAny:
         if Z_Labels is not None and Z is None:
             raise Exception("Z_Labels must be None if Z is None")
 
-        # region Labels
-        get_x_fallback_labels: Callable[[Any], List[str]]
-        if X_Label_Fallback[0] == "str()":
-            get_x_fallback_labels = lambda x: [str(i) for i in x]
-        else:
-            get_x_fallback_labels = lambda x: [str(i) for i in range(len(x))]
-
-        get_y_fallback_labels: Callable[[Any], List[str]]
-        if Y_Label_Fallback[0] == "str()":
-            get_y_fallback_labels = lambda x: [str(i) for i in x]
-        else:
-            get_y_fallback_labels = lambda x: [str(i) for i in range(len(x))]
-
-        get_z_fallback_labels: Callable[[Any], List[str]]
-        if Z_Label_Fallback[0] == "str()":
-            get_z_fallback_labels = lambda x: [str(i) for i in x]
-        else:
-            get_z_fallback_labels = lambda x: [str(i) for i in range(len(x))]
+        shard_index, shard_count = single_shard_args(shard_index, shard_count)
+        max_cells = single_max_cells(max_cells_per_run)
+
+        # Only connected labels identify values in a checkpoint, the fallbacks aren't stable between runs
+        connected_labels = [X_Labels, Y_Labels] if Z is None else [X_Labels, Y_Labels, Z_Labels]
 
+        # region Labels
         if X_Labels is None:
-            X_Labels = get_x_fallback_labels(X)
+            X_Labels = fallback_labels(X, X_Label_Fallback[0])
         if Y_Labels is None:
-            Y_Labels = get_y_fallback_labels(Y)
+            Y_Labels = fallback_labels(Y, Y_Label_Fallback[0])
         if Z_Labels is None and Z is not None:
-            Z_Labels = get_z_fallback_labels(Z)
+            Z_Labels = fallback_labels(Z, Z_Label_Fallback[0])
         # endregion
 
-        xy_product = itertools.product(X, Y)
-        X_out_tuple, Y_out_tuple = zip(*xy_product)
-        X_out: List[str] = list(X_out_tuple)
-        Y_out: List[str] = list(Y_out_tuple)
+        # Flat index k maps to X[k // (|Y|) % |X|], Y[k % |Y|], Z[k // (|X| * |Y|)]
+        xy_len = len(X) * len(Y)
+        total = xy_len * (len(Z) if Z is not None else 1)
+        axes: List[Sequence[Any]] = [X, Y] if Z is None else [X, Y, Z]
+        axis_labels = [None if labels is None else [str(lbl) for lbl in labels] for labels in connected_labels]
+        store = open_checkpoint(checkpoint_dir, axes, axis_labels, total)
+        # Only the values of this shard that aren't checkpointed yet are emitted,
+        # Total Images and Split Every still describe the whole grid
+        indices = sweep_indices(total, shard_index, shard_count, store, max_cells)
+        X_out = axis_values(X, len(Y), indices)
+        Y_out = axis_values(Y, 1, indices)
 
-        Z_out = []
+        Z_out: Sequence[Any] = []
         if Z is not None:
-            original_len = len(X_out)
-            X_out = X_out * len(Z)
-            Y_out = Y_out * len(Z)
-            for z in Z:
-                Z_out.extend([z] * original_len)
-
+            Z_out = axis_values(Z, xy_len, indices)
 
         if Z_Labels is None:
             Z_Labels = []
 
-        return X_out, X_Labels, Y_out, Y_Labels, Z_out, Z_Labels, len(X_out), len(Y)
+        checkpoint = str(store.directory) if store is not None else ""
+        return X_out, X_Labels, Y_out, Y_Labels, Z_out, Z_Labels, total, len(Y), indices, checkpoint
+
+
+class NDimProductAny:
+    """
+    Cartesian product of up to MAX_AXES axes, enumerated by flat index.
+    Axis 2 varies fastest, then Axis 1, then Axis 3, 4, ... so Axis 1/2/3 line up with X/Y/Z of XYAny and XYImage.
+    """
+    def __init__(self) -> None:
+        pass
+
+    @classmethod
+    def INPUT_TYPES(s) -> Dict[str, Dict[str, Any]]:
+        optional: Dict[str, Any] = {}
+        for axis in range(1, MAX_AXES + 1):
+            if axis > 1:
+                optional[f"Axis_{axis}"] = (ANY, {})
+            optional[f"Axis_{axis}_Labels"] = (ANY, {})
+            optional[f"Axis_{axis}_Label_Fallback"] = (LABEL_FALLBACKS, {"default": "str()"})
+        optional.update({
+            "image_width": ("INT", {"default": 512, "min": 1, "max": 16384}),
+            "image_height": ("INT", {"default": 512, "min": 1, "max": 16384}),
+            "batch_size": ("INT", {"default": 1, "min": 1, "max": 4096}),
+            "shard_index": ("INT", {"default": 0, "min": 0, "max": 4096}),
+            "shard_count": ("INT", {"default": 1, "min": 1, "max": 4096}),
+            "checkpoint_dir": ("STRING", {"default": ""}),
+            "max_cells_per_run": ("INT", {"default": 0, "min": 0, "max": 1000000}),
+        })
+        return {
+            "required": {
+                "Axis_1": (ANY, {}),
+            },
+            "optional": optional,
+        }
+
+    RETURN_NAMES, RETURN_TYPES = zip(*(
+        [item for axis in range(1, MAX_AXES + 1) for item in [(f"Axis {axis} Values", ANY), (f"Axis {axis} Labels", "STRING")]]
+        + [
+            ("Axis Sizes", "INT"),
+            ("Axis Strides", "INT"),
+            ("Sweep Size", "INT"),
+            ("Split Every", "INT"),
+            ("Grid Memory MB", "FLOAT"),
+            ("Indices", "INT"),
+            ("Checkpoint", "STRING"),
+        ]
+    ))
+
+    OUTPUT_IS_LIST = (True,) * (MAX_AXES * 2) + (True, True, False, False, False, True, False)
+    INPUT_IS_LIST = True
+    FUNCTION = "to_product"
+
+    CATEGORY = "List Stuff"
+
+    @staticmethod
+    def axis_strides(sizes: List[int]) -> List[int]:
+        """
+        :param sizes: Sizes of the connected axes, in axis order
+        :return: Stride of every axis in the flat product index
+        """
+        # Order in which the axes vary, fastest first
+        order = [1, 0] + list(range(2, len(sizes))) if len(sizes) > 1 else [0]
+        strides = [0] * len(sizes)
+        stride = 1
+        for axis in order:
+            strides[axis] = stride
+            stride *= sizes[axis]
+        return strides
+
+    def to_product(self, **kwargs: Optional[List[Any]]) -> Tuple[Any, ...]:
+        axes: List[Sequence[Any]] = []
+        labels: List[List[str]] = []
+        connected_labels: List[Optional[List[str]]] = []
+        for axis in range(1, MAX_AXES + 1):
+            values = kwargs.get(f"Axis_{axis}")
+            axis_labels = kwargs.get(f"Axis_{axis}_Labels")
+            fallback = kwargs.get(f"Axis_{axis}_Label_Fallback") or ["str()"]
+            if len(fallback) != 1:
+                raise Exception(f"Axis_{axis}_Label_Fallback must be a single value")
+            if values is None:
+                if axis_labels is not None:
+                    raise Exception(f"Axis_{axis}_Labels must be None if Axis_{axis} is None")
+                continue
+            if len(axes) != axis - 1:
+                raise Exception(f"Axis_{axis} is connected but Axis_{len(axes) + 1} is not, axes must be connected in order")
+            if axis_labels is not None and len(axis_labels) != len(values):
+                raise Exception(f"Axis_{axis}_Labels has {len(axis_labels)} labels for {len(values)} values")
+
+            axes.append(values)
+            labels.append(fallback_labels(values, fallback[0]) if axis_labels is None else [str(lbl) for lbl in axis_labels])
+            connected_labels.append(None if axis_labels is None else labels[-1])
+
+        for name in ["image_width", "image_height", "batch_size"]:
+            value = kwargs.get(name)
+            if value is not None and len(value) != 1:
+                raise Exception(f"Only single {name} value supported.")
+        image_width = (kwargs.get("image_width") or [512])[0]
+        image_height = (kwargs.get("image_height") or [512])[0]
+        batch_size = (kwargs.get("batch_size") or [1])[0]
+        shard_index, shard_count = single_shard_args(kwargs.get("shard_index"), kwargs.get("shard_count"))
+        max_cells = single_max_cells(kwargs.get("max_cells_per_run"))
+
+        sizes = [len(values) for values in axes]
+        strides = self.axis_strides(sizes)
+        total = 1
+        for size in sizes:
+            total *= size
+        store = open_checkpoint(kwargs.get("checkpoint_dir"), axes, connected_labels, total)
+        indices = sweep_indices(total, shard_index, shard_count, store, max_cells)
+
+        outputs: List[Any] = []
+        for axis in range(MAX_AXES):
+            if axis < len(axes):
+                outputs += [axis_values(axes[axis], strides[axis], indices), labels[axis]]
+            else:
+                outputs += [[], []]
+
+        # float32 RGB grid without label strips
+        grid_bytes = total * batch_size * image_width * image_height * 3 * 4
+        split_every = sizes[1] if len(sizes) > 1 else sizes[0]
+        checkpoint = str(store.directory) if store is not None else ""
+        return tuple(outputs + [sizes, strides, total, split_every, grid_bytes / (1024 * 1024), indices, checkpoint])
@@ -0,0 +1,261 @@
+from decimal import Decimal
+from typing import List, NamedTuple, Sequence, Tuple, Union
+
+import numpy as np
+
+from custom_nodes.Comfy_KepListStuff.utils import zip_with_fill
+
+Number = Union[int, float, Decimal]
+
+# Largest integer that float64 represents exactly, numerators and denominators up to this divide correctly rounded
+_MAX_EXACT = 2 ** 53
+
+
+class RangeSegment(NamedTuple):
+    """
+    Arithmetic sequence with values (start + i * step) / denominator for i in range(count).
+    All fields are integers so the values can be computed without accumulating rounding errors.
+    """
+    start: int
+    step: int
+    count: int
+    denominator: int = 1
+
+
+def _ceil_div(a: int, b: int) -> int:
+    return -((-a) // b)
+
+
+def _decimal_parts(value: Number) -> Tuple[int, int]:
+    """
+    Splits a number into an integer and a power of ten, using the shortest decimal representation of floats
+    (the value as it was typed in) instead of their exact binary expansion.
+    :return: (numerator, exponent) with value == numerator * 10 ** exponent
+    """
+    sign, digits, exponent = Decimal(str(value)).as_tuple()
+    if not isinstance(exponent, int):
+        raise ValueError(f"Range values must be finite, got {value}")
+    numerator = int("".join(str(d) for d in digits) or "0")
+    return (-numerator if sign else numerator), exponent
+
+
+def _scale_to_integers(*values: Number) -> Tuple[List[int], int]:
+    """
+    Scales all values by the same power of ten so they become integers
+    :return: (scaled values, scale)
+    """
+    parts = [_decimal_parts(v) for v in values]
+    min_exponent = min(min(exponent for _, exponent in parts), 0)
+    return [numerator * 10 ** (exponent - min_exponent) for numerator, exponent in parts], 10 ** -min_exponent
+
+
+def step_segment(start: Number, stop: Number, step: Number, inclusive: bool) -> RangeSegment:
+    """
+    Range from start towards stop in increments of step. Inclusive ranges run to stop + step (exclusive) like the
+    original Decimal implementation, so they also end with the first value past stop when stop isn't hit exactly.
+    """
+    (e_start, e_stop, e_step), scale = _scale_to_integers(start, stop, step)
+    if inclusive:
+        e_stop += e_step
+
+    if e_step == 0:
+        if e_start > e_stop:
+            raise ValueError(f"Range with step 0 never reaches {stop} from {start}")
+        return RangeSegment(e_start, e_step, 0, scale)
+
+    return RangeSegment(e_start, e_step, max(0, _ceil_div(e_stop - e_start, e_step)), scale)
+
+
+def num_steps_segment(start: Number, stop: Number, num_steps: int) -> RangeSegment:
+    """
+    num_steps evenly spaced values from start to stop, both included
+    """
+    if num_steps <= 0:
+        return RangeSegment(0, 0, 0)
+    (e_start, e_stop), scale = _scale_to_integers(start, stop)
+    if num_steps == 1:
+        return RangeSegment(e_start, 0, 1, scale)
+
+    divisions = num_steps - 1
+    return RangeSegment(e_start * divisions, e_stop - e_start, num_steps, scale * divisions)
+
+
+def int_step_segments(
+        start: List[int], stop: List[int], step: List[int], end_mode: List[str]
+) -> List[RangeSegment]:
+    segments = []
+    for e_start, e_stop, e_step, e_end_mode in zip_with_fill(start, stop, step, end_mode):
+        if e_end_mode == "Inclusive":
+            e_stop += 1
+        if e_step == 0:
+            raise ValueError("range() arg 3 must not be zero")
+        segments.append(RangeSegment(e_start, e_step, len(range(e_start, e_stop, e_step))))
+    return segments
+
+
+def float_step_segments(
+        start: List[Number], stop: List[Number], step: List[Number], end_mode: List[str]
+) -> List[RangeSegment]:
+    return [
+        step_segment(e_start, e_stop, e_step, e_end_mode == "Inclusive")
+        for e_start, e_stop, e_step, e_end_mode in zip_with_fill(start, stop, step, end_mode)
+    ]
+
+
+def float_num_steps_segments(
+        start: List[Number], stop: List[Number], num_steps: List[int]
+) -> List[RangeSegment]:
+    return [
+        num_steps_segment(e_start, e_stop, e_num_steps)
+        for e_start, e_stop, e_num_steps in zip_with_fill(start, stop, num_steps)
+    ]
+
+
+def _fits_float64(segments: Sequence[RangeSegment]) -> bool:
+    for segment in segments:
+        last = segment.start + segment.step * max(segment.count - 1, 0)
+        if max(abs(segment.start), abs(last), segment.denominator) > _MAX_EXACT:
+            return False
+    return True
+
+
+def expand_segments(segments: Sequence[RangeSegment], as_float: bool) -> Union[List[int], List[float]]:
+    """
+    Computes the values of all segments in one vectorized pass
+    :param segments:
+    :param as_float: Return floats, otherwise values are returned as ints (all denominators must be 1)
+    :return: Flat list of the values of every segment
+    """
+    if not as_float:
+        ints: List[int] = []
+        for segment in segments:
+            if segment.step == 0:
+                ints.extend([segment.start] * segment.count)
+            else:
+                ints.extend(range(segment.start, segment.start + segment.step * segment.count, segment.step))
+        return ints
+
+    if not _fits_float64(segments):
+        values: List[float] = []
+        for segment in segments:
+            # Python int division is correctly rounded regardless of size
+            values.extend((segment.start + segment.step * i) / segment.denominator for i in range(segment.count))
+        return values
+
+    counts = np.array([segment.count for segment in segments], dtype=np.int64)
+    starts = np.repeat(np.array([segment.start for segment in segments], dtype=np.int64), counts)
+    steps = np.repeat(np.array([segment.step for segment in segments], dtype=np.int64), counts)
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    numerators = starts + steps * (np.arange(int(counts.sum()), dtype=np.int64) - offsets)
+    denominators = np.repeat(np.array([segment.denominator for segment in segments], dtype=np.int64), counts)
+    return (numerators / denominators).tolist()
+
+
+def segment_sizes(segments: Sequence[RangeSegment]) -> List[int]:
+    return [segment.count for segment in segments]
+
+
+def int_num_steps_values(
+        start: List[int],
+        stop: List[int],
+        num_steps: List[int],
+        end_mode: List[str],
+        allow_uneven_steps: bool,
+) -> Tuple[List[int], List[int]]:
+    """
+    Vectorized equivalent of np.rint(np.linspace(start, stop, num_steps)) for every broadcast range.
+    :return: (values, range_sizes)
+    """
+    starts, steps, stops, counts = [], [], [], []
+    for e_start, e_stop, e_num_steps, e_end_mode in zip_with_fill(start, stop, num_steps, end_mode):
+        direction = 1 if e_stop > e_start else -1
+        if e_end_mode == "Exclusive":
+            e_stop -= direction
+
+        if e_num_steps < 0:
+            raise ValueError(f"num_steps must not be negative, got {e_num_steps}.")
+        if e_num_steps < 2:
+            # Like np.linspace, 0 steps is an empty range and 1 step is only start
+            starts.append(e_start)
+            stops.append(e_start)
+            steps.append(0)
+            counts.append(e_num_steps)
+            continue
+        if not allow_uneven_steps and (e_stop - e_start) % (e_num_steps - 1) != 0:
+            raise ValueError(
+                f"Uneven steps detected for start={e_start}, stop={e_stop}, num_steps={e_num_steps}."
+            )
+        starts.append(e_start)
+        stops.append(e_stop)
+        steps.append((e_stop - e_start) / (e_num_steps - 1))
+        counts.append(e_num_steps)
+
+    if all(step == int(step) for step in steps):
+        return expand_segments([RangeSegment(s, int(st), c) for s, st, c in zip(starts, steps, counts)], as_float=False), counts
+
+    counts_arr = np.array(counts, dtype=np.int64)
+    offsets = np.cumsum(counts_arr) - counts_arr
+    idx = np.arange(int(counts_arr.sum()), dtype=np.float64) - np.repeat(offsets, counts_arr)
+    # Same formula as np.linspace: i * step + start, with the last value set to stop exactly
+    values = idx * np.repeat(np.array(steps, dtype=np.float64), counts_arr)
+    values += np.repeat(np.array(starts, dtype=np.float64), counts_arr)
+    non_empty = counts_arr > 0
+    values[(offsets + counts_arr - 1)[non_empty]] = np.array(stops, dtype=np.float64)[non_empty]
+    return np.rint(values).astype(int).tolist(), counts
+
+
+if __name__ == "__main__":
+    # Regression checks: python -m custom_nodes.Comfy_KepListStuff.range_engine
+    import random
+    from fractions import Fraction
+
+    def _reference_values(start: Number, stop: Number, step: Number, inclusive: bool) -> List[float]:
+        """
+        Scalar Range(Step) - Float computed with exact fractions of the values as typed, used by the checks below
+        """
+        f_start, f_stop, f_step = (Fraction(str(v)) for v in (start, stop, step))
+        if inclusive:
+            f_stop += f_step
+        values = []
+        value = f_start
+        direction = 1 if f_step > 0 else -1
+        while (value - f_stop) * direction < 0:
+            values.append(float(value))
+            value += f_step
+        return values
+
+    rng = random.Random(0)
+    for _ in range(2000):
+        r_start = round(rng.uniform(-5, 5), rng.randint(0, 3))
+        r_stop = round(rng.uniform(-5, 5), rng.randint(0, 3))
+        r_step = round(rng.uniform(0.1, 2), rng.randint(1, 3)) * (1 if r_stop >= r_start else -1)
+        r_inclusive = rng.random() < 0.5
+        r_segment = step_segment(r_start, r_stop, r_step, r_inclusive)
+        expected = _reference_values(r_start, r_stop, r_step, r_inclusive)
+        assert expand_segments([r_segment], True) == expected, (r_start, r_stop, r_step, r_inclusive)
+
+        r_num_steps = rng.randint(1, 50)
+        r_segment = num_steps_segment(r_start, r_stop, r_num_steps)
+        f_start, f_stop = Fraction(str(r_start)), Fraction(str(r_stop))
+        expected = [float(f_start)] if r_num_steps == 1 else [
+            float(f_start + (f_stop - f_start) * i / (r_num_steps - 1)) for i in range(r_num_steps)
+        ]
+        assert expand_segments([r_segment], True) == expected, (r_start, r_stop, r_num_steps)
+
+    for i_start, i_stop in [(0, 10), (10, 0), (-7, 13), (3, 3)]:
+        for i_num_steps in [0, 1, 2, 3, 7, 21]:
+            for i_end_mode in ["Inclusive", "Exclusive"]:
+                i_values, i_sizes = int_num_steps_values([i_start], [i_stop], [i_num_steps], [i_end_mode], True)
+                direction = 1 if i_stop > i_start else -1
+                i_last = i_stop - direction if i_end_mode == "Exclusive" else i_stop
+                assert list(i_values) == np.rint(np.linspace(i_start, i_last, i_num_steps)).astype(int).tolist()
+                assert i_sizes == [i_num_steps]
+
+    assert int_num_steps_values([0, 0, 0], [10, 10, 10], [3, 0, 1], ["Inclusive"], False) == ([0, 5, 10, 0], [3, 0, 1])
+    assert int_num_steps_values([0, 0, 0], [10, 10, 10], [4, 0, 1], ["Inclusive"], True) == ([0, 3, 7, 10, 0], [4, 0, 1])
+
+    # Counts that changed from the Decimal based implementation, which rounded the binary value of the inputs
+    assert segment_sizes(float_num_steps_segments([0.525], [2.077], [2])) == [2]
+    assert segment_sizes(float_step_segments([-2.65], [0.2], [0.05], ["Exclusive"])) == [57]
+    assert segment_sizes(float_step_segments([-2.65], [0.2], [0.05], ["Inclusive"])) == [58]
+    print("range_engine checks passed")
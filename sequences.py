@@ -0,0 +1,181 @@
+import bisect
+import itertools
+from typing import Any, Iterator, List, Sequence, Union, overload
+
+
+class SequenceView(Sequence[Any]):
+    """
+    Base class of the read-only list views. Views only keep references to the sequences they wrap,
+    length and indexing are O(1) (O(log parts) for concatenations) and nothing is copied.
+    Slicing returns a view too, so pages of a lazy list are only loaded when they are rendered.
+    """
+    def _item(self, idx: int) -> Any:
+        raise NotImplementedError
+
+    @overload
+    def __getitem__(self, idx: int) -> Any: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> "SliceView": ...
+
+    def __getitem__(self, idx: Union[int, slice]) -> Any:
+        if isinstance(idx, slice):
+            return SliceView(self, range(len(self))[idx])
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"{type(self).__name__} index out of range")
+        return self._item(idx)
+
+    def __add__(self, other: Sequence[Any]) -> Sequence[Any]:
+        return concat([self, other])
+
+    def __radd__(self, other: Sequence[Any]) -> Sequence[Any]:
+        return concat([other, self])
+
+    def __mul__(self, count: int) -> Sequence[Any]:
+        return repeat(self, count)
+
+    __rmul__ = __mul__
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(len={len(self)})"
+
+
+class ReversedView(SequenceView):
+    def __init__(self, base: Sequence[Any]) -> None:
+        self.base = base
+
+    def __len__(self) -> int:
+        return len(self.base)
+
+    def _item(self, idx: int) -> Any:
+        return self.base[len(self.base) - 1 - idx]
+
+    def __iter__(self) -> Iterator[Any]:
+        return reversed(self.base)
+
+
+class RepeatedView(SequenceView):
+    def __init__(self, base: Sequence[Any], count: int) -> None:
+        self.base = base
+        self.count = max(count, 0)
+
+    def __len__(self) -> int:
+        return len(self.base) * self.count
+
+    def _item(self, idx: int) -> Any:
+        return self.base[idx % len(self.base)]
+
+    def __iter__(self) -> Iterator[Any]:
+        return itertools.chain.from_iterable(itertools.repeat(self.base, self.count))
+
+
+class ConcatView(SequenceView):
+    def __init__(self, parts: Sequence[Sequence[Any]]) -> None:
+        self.parts = list(parts)
+        self._ends = list(itertools.accumulate(len(part) for part in self.parts))
+
+    def __len__(self) -> int:
+        return self._ends[-1] if self._ends else 0
+
+    def _item(self, idx: int) -> Any:
+        part_idx = bisect.bisect_right(self._ends, idx)
+        part_start = self._ends[part_idx - 1] if part_idx > 0 else 0
+        return self.parts[part_idx][idx - part_start]
+
+    def __iter__(self) -> Iterator[Any]:
+        return itertools.chain.from_iterable(self.parts)
+
+
+class SliceView(SequenceView):
+    def __init__(self, base: Sequence[Any], indices: range) -> None:
+        self.base = base
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def _item(self, idx: int) -> Any:
+        return self.base[self.indices[idx]]
+
+    def __iter__(self) -> Iterator[Any]:
+        return map(self.base.__getitem__, self.indices)
+
+
+class ListHandle:
+    """
+    A whole (lazy) sequence passed between nodes as a single value.
+    ComfyUI copies list outputs into a new list item by item, which would load every item of a lazy sequence.
+    A handle is output as one non-list value instead, the list nodes of this package unwrap it.
+    """
+    def __init__(self, items: Sequence[Any]) -> None:
+        self.items = items
+
+    def __repr__(self) -> str:
+        return f"ListHandle({type(self.items).__name__}, len={len(self.items)})"
+
+
+def unwrap(values: Sequence[Any]) -> Sequence[Any]:
+    """
+    :param values: List input of a node
+    :return: The sequence of the handle if values is a single ListHandle, otherwise values
+    """
+    if len(values) == 1 and isinstance(values[0], ListHandle):
+        return values[0].items
+    return values
+
+
+def is_handle(values: Sequence[Any]) -> bool:
+    return len(values) == 1 and isinstance(values[0], ListHandle)
+
+
+def wrap_like(inputs: Sequence[Sequence[Any]], result: Sequence[Any]) -> Sequence[Any]:
+    """
+    Wraps a list output in a handle if any of the inputs it was computed from came as a handle, so it stays lazy
+    """
+    if any(is_handle(values) for values in inputs):
+        return [ListHandle(result)]
+    return result
+
+
+# Plain lists are copied rather than wrapped in views: ComfyUI copies every list output item by item,
+# which is a C loop for lists but goes through the view for anything else.
+# Views are only returned for lazy sequences, which are passed in a ListHandle.
+
+def reverse(seq: Sequence[Any]) -> Sequence[Any]:
+    if isinstance(seq, list):
+        return seq[::-1]
+    if isinstance(seq, ReversedView):
+        return seq.base
+    return ReversedView(seq)
+
+
+def repeat(seq: Sequence[Any], count: int) -> Sequence[Any]:
+    if isinstance(seq, list):
+        return seq * max(count, 0)
+    if isinstance(seq, RepeatedView):
+        return RepeatedView(seq.base, seq.count * count)
+    return RepeatedView(seq, count)
+
+
+def concat(parts: Sequence[Sequence[Any]]) -> Sequence[Any]:
+    if all(isinstance(part, list) for part in parts):
+        joined: List[Any] = []
+        for part in parts:
+            joined.extend(part)
+        return joined
+    flat: List[Sequence[Any]] = []
+    for part in parts:
+        if isinstance(part, ConcatView):
+            flat.extend(part.parts)
+        elif len(part) > 0:
+            flat.append(part)
+    return ConcatView(flat)
+
+
+def materialize(seq: Sequence[Any]) -> List[Any]:
+    """
+    Copies any sequence (views, lazy image lists) into a real list
+    """
+    return list(seq)
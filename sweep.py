@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+import torch
+from torch import Tensor
+
+
+# Emitted as the only index when there is nothing left to render. ComfyUI fails on empty lists between nodes,
+# so the product nodes emit one combination with this index, which the saving nodes skip.
+PLACEHOLDER_INDEX = -1
+
+
+def shard_range(total: int, shard_index: int, shard_count: int) -> range:
+    """
+    Contiguous slice of the flat indices [0, total) handled by one shard.
+    Shards are disjoint, cover every index and differ in size by at most one.
+    :param total: Number of items in the whole sweep
+    :param shard_index: 0 based index of the shard
+    :param shard_count: Number of shards the sweep is split into
+    :return:
+    """
+    if shard_count < 1:
+        raise ValueError(f"shard_count must be at least 1, got {shard_count}")
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"shard_index must be in [0, {shard_count}), got {shard_index}")
+    return range(total * shard_index // shard_count, total * (shard_index + 1) // shard_count)
+
+
+def _value_fingerprint(value: Any) -> Optional[str]:
+    """
+    :return: Fingerprint of the content of value, None if it has no content that can be compared between runs
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return repr(value)
+    if isinstance(value, torch.Tensor):
+        value = value.detach().cpu().float().contiguous().numpy()
+    if isinstance(value, np.ndarray):
+        return f"array{value.shape}:{hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest()}"
+    if isinstance(value, (list, tuple)):
+        items = [_value_fingerprint(item) for item in value]
+        if any(item is None for item in items):
+            return None
+        return f"{type(value).__name__}[{','.join(items)}]"  # type: ignore[arg-type]
+    if isinstance(value, dict):
+        entries = [(repr(key), _value_fingerprint(item)) for key, item in value.items()]
+        if any(item is None for _, item in entries):
+            return None
+        return "dict{" + ",".join(f"{key}:{item}" for key, item in sorted(entries)) + "}"
+    # Models, VAEs, ... have no stable repr and hashing their weights would take longer than the sweep
+    return None
+
+
+def sweep_key(axes: Sequence[Sequence[Any]], labels: Sequence[Optional[Sequence[str]]]) -> str:
+    """
+    Hash of the values of every axis of a sweep, so a checkpoint is only reused for the exact same sweep
+    :param axes: Values of every axis, in axis order
+    :param labels: Labels connected to every axis, None for axes labeled by a fallback.
+        Values whose content can't be fingerprinted are identified by their connected label instead.
+    :return:
+    """
+    digest = hashlib.sha1()
+    for axis, (values, axis_labels) in enumerate(zip(axes, labels), start=1):
+        digest.update(b"axis")
+        for idx, value in enumerate(values):
+            fingerprint = _value_fingerprint(value)
+            if fingerprint is None:
+                if axis_labels is None or idx >= len(axis_labels):
+                    # Fallback labels are str() (often containing the object's address) or the index,
+                    # neither tells the values of two runs apart
+                    raise ValueError(
+                        f"Axis {axis} has {type(value).__name__} values, which can't be compared between runs. "
+                        f"Connect labels that name every value of the axis to checkpoint it."
+                    )
+                fingerprint = f"{type(value).__name__}:{axis_labels[idx]}"
+            digest.update(fingerprint.encode())
+            digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class SweepCellStore:
+    """
+    Directory of the rendered cells of a sweep, one .npy file per flat product index.
+    Writes are atomic (temp file + rename), so any number of workers can share one directory
+    and a reader never sees a partially written cell.
+    """
+    CELL_PATTERN = re.compile(r"^cell_(\d+)\.npy$")
+    MANIFEST = "sweep.json"
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def cell_path(self, index: int) -> Path:
+        return self.directory / f"cell_{index:08d}.npy"
+
+    def write_manifest(self, total: int, sizes: List[int]) -> None:
+        """
+        Records the shape of the sweep, so consumers of the store know how many cells make up the whole grid
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        manifest = self.directory / self.MANIFEST
+        tmp = manifest.with_name(f"{manifest.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"total": total, "sizes": sizes}, f)
+        os.replace(tmp, manifest)
+
+    def read_total(self) -> int:
+        try:
+            with open(self.directory / self.MANIFEST) as f:
+                return int(json.load(f)["total"])
+        except (OSError, ValueError, KeyError) as e:
+            raise Exception(f"No sweep manifest in {self.directory}: {e}") from e
+
+    def put(self, index: int, images: Tensor) -> None:
+        """
+        :param index: Flat product index of the cell
+        :param images: Image batch [B, H, W, C] of the cell
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = self.cell_path(index)
+        tmp = entry.with_name(f"{entry.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, images.detach().cpu().numpy())
+        os.replace(tmp, entry)
+
+    def get(self, index: int) -> Optional[Tensor]:
+        try:
+            arr = np.load(self.cell_path(index))
+        except (OSError, ValueError):
+            return None
+        return torch.from_numpy(arr)
+
+    def indices(self) -> Set[int]:
+        if not self.directory.is_dir():
+            return set()
+        found = set()
+        for entry in self.directory.iterdir():
+            match = self.CELL_PATTERN.match(entry.name)
+            if match is not None:
+                found.add(int(match.group(1)))
+        return found
+
+    def missing(self, indices: Iterable[int]) -> List[int]:
+        present = self.indices()
+        return [idx for idx in indices if idx not in present]
+
+    def load_all(self, total: int) -> List[Tensor]:
+        """
+        :param total: Number of cells in the sweep
+        :return: Image batches of the cells 0..total-1
+        """
+        missing = self.missing(range(total))
+        if missing:
+            shown = ", ".join(str(idx) for idx in missing[:10])
+            more = f" and {len(missing) - 10} more" if len(missing) > 10 else ""
+            raise Exception(f"{len(missing)} of {total} cells missing in {self.directory}: {shown}{more}")
+
+        cells = []
+        for idx in range(total):
+            cell = self.get(idx)
+            if cell is None:
+                raise Exception(f"Failed to load cell {idx} from {self.cell_path(idx)}")
+            cells.append(cell)
+        return cells
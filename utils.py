@@ -1,8 +1,11 @@
-from typing import Dict, Any, List, Tuple, Optional, Iterator, Union
+import tempfile
+from pathlib import Path
+from typing import Dict, Any, List, Tuple, Optional, Iterator, Sequence, Union
 
 import PIL.Image
 import numpy as np
 import torch
+import torch.nn.functional as F
 from PIL import Image
 from torch import Tensor
 
@@ -61,7 +64,94 @@ def tensor2pil(image: Tensor) -> PIL.Image.Image:
 def pil2tensor(image: PIL.Image.Image) -> Tensor:
     return torch.from_numpy(np.array(image).astype(np.float32) / 255.0).unsqueeze(0)
 
+
+class UInt8Buffer:
+    """
+    Reusable uint8 CPU buffer for the batch converters, grown when a larger batch comes in.
+    Anything returned from it is only valid until the buffer is used again.
+    """
+    def __init__(self) -> None:
+        self._storage = torch.empty(0, dtype=torch.uint8)
+
+    def get(self, shape: Tuple[int, ...]) -> Tensor:
+        numel = int(np.prod(shape))
+        if self._storage.numel() < numel:
+            self._storage = torch.empty(numel, dtype=torch.uint8)
+        return self._storage[:numel].view(shape)
+
+
+def batch2uint8(images: Tensor, buffer: Optional[UInt8Buffer] = None, channels: Optional[int] = None) -> Tensor:
+    """
+    Converts a whole float batch to uint8 on the CPU with the same rounding as tensor2pil (clip, then truncate).
+    Scaling and clipping run on the device of images, so only the uint8 result is transferred.
+    :param images: Tensor [N, H, W, C] in 0..1
+    :param buffer: Optional buffer to write into instead of allocating
+    :param channels: Channels of the result, extra channels are filled with 255
+    :return: uint8 Tensor [N, H, W, channels]
+    """
+    n, h, w, c = images.shape
+    channels = c if channels is None else channels
+    shape = (n, h, w, channels)
+    out = buffer.get(shape) if buffer is not None else torch.empty(shape, dtype=torch.uint8)
+    if channels > c:
+        out[..., c:] = 255
+    out[..., :c].copy_(images.detach().mul(255.0).clamp_(0.0, 255.0))
+    return out
+
+
+def uint82tensor(arr: Union[np.ndarray, Tensor]) -> Tensor:
+    """
+    Converts uint8 pixels to float32 in 0..1 with a single allocation, the shape is kept
+    """
+    if isinstance(arr, Tensor):
+        return arr.to(torch.float32).div_(255.0)
+    return torch.from_numpy(np.asarray(arr).astype(np.float32)).div_(255.0)
+
+
+def pils2batch(images: Sequence[PIL.Image.Image]) -> Tensor:
+    """
+    Converts PIL images of the same size and mode to one float batch [N, H, W, C], converting to float once
+    """
+    width, height = images[0].size
+    stacked = np.empty((len(images), height, width, len(images[0].getbands())), dtype=np.uint8)
+    for idx, image in enumerate(images):
+        stacked[idx] = np.asarray(image).reshape(stacked.shape[1:])
+    return uint82tensor(stacked)
+
+def resize_batch(images: Tensor, height: int, width: int) -> Tensor:
+    """
+    Resizes a batch [N, H, W, C] with area interpolation, which averages the covered pixels when shrinking
+    """
+    if images.shape[1] == height and images.shape[2] == width:
+        return images
+    resized = F.interpolate(images.movedim(-1, 1).float(), size=(height, width), mode="area")
+    return resized.movedim(1, -1).to(images.dtype)
+
+
 # Hack: string type that is always equal in not equal comparisons
+def output_directory() -> Path:
+    """
+    ComfyUI's output directory, or a directory in the system temp directory when running outside of ComfyUI
+    """
+    try:
+        import folder_paths
+    except ImportError:
+        return Path(tempfile.gettempdir()) / "Comfy_KepListStuff" / "exports"
+    return Path(folder_paths.get_output_directory())
+
+
+def temp_directory() -> Path:
+    """
+    ComfyUI's temp directory, which is on disk next to the output directory, or the system temp directory when
+    running outside of ComfyUI
+    """
+    try:
+        import folder_paths
+    except ImportError:
+        return Path(tempfile.gettempdir())
+    return Path(folder_paths.get_temp_directory())
+
+
 class AnyType(str):
     def __ne__(self, __value: object) -> bool:
         return False